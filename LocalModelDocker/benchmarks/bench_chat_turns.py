@@ -0,0 +1,86 @@
+# bench_chat_turns.py
+"""
+Per-turn latency of a long /chatinference conversation in both chat modes:
+CHAT_API_MODE=chat (structured /api/chat, Ollama reuses the cached prompt
+prefix) and CHAT_API_MODE=generate (flattened prompt on /api/generate).
+
+For the reported turns it prints the wall latency of the /chatinference call
+and Ollama's prompt_eval_count / prompt_eval_duration for that turn: with
+prefix reuse only the new part of the prompt is evaluated, so both stay small
+as the conversation grows.
+
+Needs a running Ollama with the model pulled:
+
+    OLLAMA_HOST=http://localhost:11434 python benchmarks/bench_chat_turns.py --model qwen2.5:0.5b
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main  # noqa: E402
+
+
+async def run_conversation(client: httpx.AsyncClient, mode: str, args) -> dict:
+    """Drive one conversation; returns turn -> (wall seconds, prompt_eval_count, prompt_eval_seconds)"""
+    main.CHAT_API_MODE = mode
+    session_id = f"bench-{mode}-{uuid.uuid4().hex[:8]}"
+    last_ollama = {}
+
+    async def capture(response: httpx.Response):
+        if response.request.url.path in ("/api/chat", "/api/generate"):
+            await response.aread()
+            last_ollama.update(response.json())
+
+    main.http_client.event_hooks["response"] = [capture]
+    results = {}
+    for turn in range(1, args.turns + 1):
+        last_ollama.clear()
+        started = time.perf_counter()
+        response = await client.post("/chatinference", json={
+            "CHAT_INPUT": [{"role": "user", "content": f"Turn {turn}: give me one short fact about the number {turn}."}],
+            "model": args.model,
+            "stream": False,
+            "session_id": session_id
+        }, timeout=600)
+        response.raise_for_status()
+        wall = time.perf_counter() - started
+        results[turn] = (
+            wall,
+            last_ollama.get("prompt_eval_count"),
+            last_ollama.get("prompt_eval_duration", 0) / 1e9
+        )
+    await main.chat_memory.delete(session_id)
+    return results
+
+
+async def run(args):
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://wrapper.local") as client:
+            for mode in args.modes:
+                results = await run_conversation(client, mode, args)
+                print(f"CHAT_API_MODE={mode}")
+                for turn in args.report:
+                    if turn in results:
+                        wall, evaluated, eval_seconds = results[turn]
+                        print(
+                            f"  turn {turn:>3}: wall {wall * 1000:8.1f} ms | "
+                            f"prompt_eval_count {evaluated if evaluated is not None else 'n/a':>6} | "
+                            f"prompt_eval_duration {eval_seconds * 1000:8.1f} ms"
+                        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="qwen2.5:0.5b")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--report", type=int, nargs="+", default=[1, 10, 50], help="turns to print")
+    parser.add_argument("--modes", nargs="+", default=["chat", "generate"], choices=["chat", "generate"])
+    asyncio.run(run(parser.parse_args()))
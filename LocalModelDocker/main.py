@@ -1,18 +1,80 @@
 import os
 import json
-import requests
-from typing import Optional, List, Dict, Generator
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+import httpx
+from typing import Optional, List, Dict, AsyncIterator
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from collections import defaultdict
-
-app = FastAPI(title="Ollama API Wrapper")
+from collections import OrderedDict
 
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 
-# In-memory session chat storage
-chat_memory = defaultdict(list)
+# Pooled async client shared by all endpoints; sized to Ollama's parallelism
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "32"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "8"))
+
+# Session store: "memory" or "sqlite" (survives restarts)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))  # idle seconds before a session is dropped
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))  # user/assistant turns kept per session
+SESSION_MAX_TOKENS = int(os.getenv("SESSION_MAX_TOKENS", "3000"))  # estimated tokens kept per session
+# A session over either budget is cut down to this fraction of it, so the history (and
+# Ollama's cached prompt prefix) then stays unchanged for many turns until the next cut
+SESSION_TRIM_TARGET = float(os.getenv("SESSION_TRIM_TARGET", "0.5"))
+
+# Chat backend: "chat" sends structured messages to /api/chat so Ollama can reuse
+# the KV cache of the unchanged conversation prefix; "generate" is the legacy
+# flattened User:/Assistant: prompt posted to /api/generate
+CHAT_API_MODE = os.getenv("CHAT_API_MODE", "chat")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # keep the model (and its cache) resident between turns
+
+# Model manager: comma-separated models kept loaded and pinned, "alias=model" pairs,
+# how many models may be resident before the least recently used is unloaded,
+# and how many requests each model serves at once (further requests queue)
+WARM_MODELS = [m.strip() for m in os.getenv("WARM_MODELS", "").split(",") if m.strip()]
+MODEL_ALIASES = dict(
+    pair.split("=", 1) for pair in os.getenv("MODEL_ALIASES", "").split(",") if "=" in pair
+)
+MAX_LOADED_MODELS = int(os.getenv("MAX_LOADED_MODELS", "2"))
+MODEL_MAX_CONCURRENCY = int(os.getenv("MODEL_MAX_CONCURRENCY", "4"))
+
+# Background pulls: how many downloads run at once and how long finished jobs stay queryable
+PULL_MAX_CONCURRENCY = int(os.getenv("PULL_MAX_CONCURRENCY", "1"))
+PULL_JOB_TTL = float(os.getenv("PULL_JOB_TTL", "3600"))
+
+if CHAT_API_MODE not in ("chat", "generate"):
+    raise ValueError(f"CHAT_API_MODE must be 'chat' or 'generate', got {CHAT_API_MODE!r}")
+
+http_client: Optional[httpx.AsyncClient] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=OLLAMA_HOST,
+        limits=httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_KEEPALIVE
+        ),
+        timeout=120
+    )
+    await model_manager.start()
+    yield
+    await model_manager.stop()
+    await pull_jobs.stop()
+    await http_client.aclose()
+    http_client = None
+    chat_memory.close()
+
+app = FastAPI(title="Ollama API Wrapper", lifespan=lifespan)
 
 # ==== MODELS ==== #
 
@@ -23,7 +85,7 @@ class ChatMessage(BaseModel):
 class ChatInferenceRequest(BaseModel):
     CHAT_INPUT: Optional[List[ChatMessage]] = []
     model: Optional[str] = "qwen2.5:0.5b"
-    stream: Optional[bool] = False
+    stream: Optional[bool] = True
     session_id: Optional[str] = "default"
 
 class ChatInferenceResponse(BaseModel):
@@ -47,6 +109,500 @@ class OpenAIChatRequest(BaseModel):
     temperature: Optional[float] = 0.7
     top_p: Optional[float] = 0.9
     stream: Optional[bool] = False
+    stream_options: Optional[Dict] = None
+
+# ==== SESSION STORE ==== #
+
+def estimate_tokens(text: str) -> int:
+    # Rough estimate (~4 characters per token); good enough for budgeting history
+    return len(text) // 4 + 1
+
+def split_turns(messages: List[ChatMessage]) -> List[List[ChatMessage]]:
+    """Group non-system messages into turns, each a user message followed by its replies"""
+    turns = []
+    for m in messages:
+        role = m.role.lower()
+        if role == "system":
+            continue
+        if role == "user" or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return turns
+
+def trim_history(messages: List[ChatMessage]) -> List[ChatMessage]:
+    """
+    Once the session exceeds its turn or token budget, drop the oldest whole
+    turns until it is down to SESSION_TRIM_TARGET of both; system prompts are
+    kept. Cutting well below the budget means the history is only rewritten
+    every few turns, and in between each prompt extends the previous one.
+    """
+    system = [m for m in messages if m.role.lower() == "system"]
+    turns = split_turns(messages)
+    costs = [sum(estimate_tokens(m.content) for m in turn) for turn in turns]
+    budget = SESSION_MAX_TOKENS - sum(estimate_tokens(m.content) for m in system)
+    total = sum(costs)
+    start = 0
+    if len(turns) > SESSION_MAX_TURNS or total > budget:
+        max_turns = max(1, int(SESSION_MAX_TURNS * SESSION_TRIM_TARGET))
+        max_tokens = budget * SESSION_TRIM_TARGET
+        while start < len(turns) and (len(turns) - start > max_turns or total > max_tokens):
+            if len(turns) - start == 1 and total <= budget:
+                break  # the newest turn alone fits the budget; keep it
+            total -= costs[start]
+            start += 1
+    return system + [m for turn in turns[start:] for m in turn]
+
+class InMemorySessionStore:
+    """Sessions kept in LRU order; idle or excess sessions are evicted from the cold end"""
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # session_id -> (last_seen, messages)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, session_id: str) -> List[ChatMessage]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return []
+        if time.time() - entry[0] > self.ttl:
+            del self._sessions[session_id]
+            return []
+        return list(entry[1])
+
+    async def append(self, session_id: str, messages: List[ChatMessage]):
+        history = await self.get(session_id)
+        self._sessions[session_id] = (time.time(), trim_history(history + messages))
+        self._sessions.move_to_end(session_id)
+        self._evict()
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def _evict(self):
+        now = time.time()
+        while self._sessions:
+            last_seen = next(iter(self._sessions.values()))[0]
+            if len(self._sessions) <= self.max_sessions and now - last_seen <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def close(self):
+        self._sessions.clear()
+
+class SQLiteSessionStore:
+    """File-backed sessions that survive restarts; queries run off the event loop"""
+
+    EVICT_EVERY = 100  # writes between eviction sweeps
+
+    def __init__(self, path: str, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions(updated_at)")
+        self._conn.commit()
+
+    def _read(self, session_id: str) -> List[ChatMessage]:
+        # Caller holds self._lock
+        row = self._conn.execute(
+            "SELECT messages, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return []
+        return [ChatMessage(**m) for m in json.loads(row[0])]
+
+    def _load(self, session_id: str) -> List[ChatMessage]:
+        with self._lock:
+            return self._read(session_id)
+
+    def _save(self, session_id: str, messages: List[ChatMessage]):
+        # Read and write under one lock hold so concurrent appends to a session don't lose turns
+        with self._lock:
+            history = trim_history(self._read(session_id) + messages)
+            data = json.dumps([m.dict() for m in history], ensure_ascii=False)
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, messages, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET messages = excluded.messages, updated_at = excluded.updated_at",
+                (session_id, data, time.time())
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def _delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    async def get(self, session_id: str) -> List[ChatMessage]:
+        return await asyncio.to_thread(self._load, session_id)
+
+    async def append(self, session_id: str, messages: List[ChatMessage]):
+        await asyncio.to_thread(self._save, session_id, messages)
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(self._delete, session_id)
+
+    def close(self):
+        self._conn.close()
+
+def create_session_store():
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(SESSION_DB_PATH, SESSION_TTL, SESSION_MAX_SESSIONS)
+    if SESSION_BACKEND != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+    return InMemorySessionStore(SESSION_TTL, SESSION_MAX_SESSIONS)
+
+# Session chat storage, bounded by TTL, session count and per-session budgets
+chat_memory = create_session_store()
+
+# ==== MODEL MANAGER ==== #
+
+class ModelManager:
+    """
+    Tracks which Ollama models are resident and routes requests onto them.
+    Warm models are loaded at startup and pinned (keep_alive=-1); other models
+    are loaded on demand and the least recently used unpinned model is unloaded
+    once more than max_loaded are resident. Concurrent requests for a cold model
+    share a single load, and each model serves at most max_concurrency requests.
+    """
+    def __init__(
+        self,
+        warm: List[str],
+        aliases: Dict[str, str],
+        max_loaded: int,
+        max_concurrency: int
+    ):
+        self.aliases = {k.strip(): v.strip() for k, v in aliases.items()}
+        self.pinned = {self.resolve(m) for m in warm}
+        self.max_loaded = max(max_loaded, len(self.pinned), 1)
+        self.max_concurrency = max_concurrency
+        self._loaded: "OrderedDict[str, None]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._lock = asyncio.Lock()
+        self._warm_tasks: List[asyncio.Task] = []
+        self.stats: Dict[str, Dict] = {}
+
+    def resolve(self, model: str) -> str:
+        return self.aliases.get(model, model)
+
+    def keep_alive(self, model: str):
+        return -1 if model in self.pinned else OLLAMA_KEEP_ALIVE
+
+    def _stats(self, model: str) -> Dict:
+        if model not in self.stats:
+            self.stats[model] = {
+                "loads": 0,
+                "unloads": 0,
+                "load_failures": 0,
+                "last_load_seconds": None,
+                "total_load_seconds": 0.0,
+                "queued": 0
+            }
+        return self.stats[model]
+
+    async def start(self):
+        # Adopt whatever Ollama already has resident so we don't reload it
+        try:
+            response = await http_client.get("/api/ps", timeout=10)
+            response.raise_for_status()
+            for entry in response.json().get("models", []):
+                self._loaded[entry.get("name") or entry.get("model")] = None
+        except Exception:
+            pass
+        self._warm_tasks = [
+            asyncio.create_task(self._preload(model)) for model in self.pinned
+        ]
+
+    async def stop(self):
+        for task in self._warm_tasks:
+            task.cancel()
+
+    async def _preload(self, model: str):
+        try:
+            await self.ensure_loaded(model)
+        except Exception:
+            pass  # recorded in load_failures; the first request retries the load
+
+    async def ensure_loaded(self, model: str):
+        async with self._lock:
+            if model in self._loaded and model not in self._loading:
+                self._loaded.move_to_end(model)
+                return
+            task = self._loading.get(model)
+            if task is None:
+                # Evict under the lock, before any await, so concurrent loads of
+                # other models see this one's reserved slot
+                task = asyncio.create_task(self._load(model, self._pick_victims()))
+                self._loading[model] = task
+                task.add_done_callback(lambda _, m=model: self._loading.pop(m, None))
+        await asyncio.shield(task)
+
+    async def _load(self, model: str, victims: List[str]):
+        stats = self._stats(model)
+        for victim in victims:
+            await self.unload(victim)
+        started = time.perf_counter()
+        try:
+            # A generate call without a prompt only loads the model
+            response = await http_client.post(
+                "/api/generate",
+                json={"model": model, "keep_alive": self.keep_alive(model)},
+                timeout=600
+            )
+            response.raise_for_status()
+        except Exception:
+            stats["load_failures"] += 1
+            raise
+        elapsed = time.perf_counter() - started
+        stats["loads"] += 1
+        stats["last_load_seconds"] = round(elapsed, 3)
+        stats["total_load_seconds"] += elapsed
+        self._loaded[model] = None
+        self._loaded.move_to_end(model)
+
+    def _pick_victims(self) -> List[str]:
+        """Take idle unpinned models out of the resident set until one more load fits; caller holds the lock."""
+        victims = []
+        # Models still loading count towards max_loaded too
+        while len(self._loaded) + len(self._loading) >= self.max_loaded:
+            victim = next(
+                (m for m in self._loaded
+                 if m not in self.pinned and not self._in_flight.get(m)),
+                None
+            )
+            if victim is None:
+                break  # everything resident is pinned or busy; let Ollama cope
+            del self._loaded[victim]
+            victims.append(victim)
+        return victims
+
+    async def unload(self, model: str):
+        self._loaded.pop(model, None)
+        try:
+            response = await http_client.post(
+                "/api/generate", json={"model": model, "keep_alive": 0}, timeout=30
+            )
+            response.raise_for_status()
+            self._stats(model)["unloads"] += 1
+        except Exception:
+            pass
+
+    def forget(self, model: str):
+        """Drop a model from the resident set, e.g. after it was deleted."""
+        self._loaded.pop(model, None)
+
+    async def acquire(self, model: str) -> str:
+        """Resolve an alias, load the model if needed and take a concurrency slot."""
+        model = self.resolve(model)
+        stats = self._stats(model)
+        self._in_flight[model] = self._in_flight.get(model, 0) + 1
+        stats["queued"] += 1
+        try:
+            await self.ensure_loaded(model)
+            semaphore = self._semaphores.setdefault(
+                model, asyncio.Semaphore(self.max_concurrency)
+            )
+            await semaphore.acquire()
+        except BaseException:
+            self._in_flight[model] -= 1
+            raise
+        finally:
+            stats["queued"] -= 1
+        return model
+
+    def release(self, model: str):
+        self._semaphores[model].release()
+        self._in_flight[model] -= 1
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Hold a loaded model's concurrency slot for the duration of the block."""
+        model = await self.acquire(model)
+        try:
+            yield model
+        finally:
+            self.release(model)
+
+    def snapshot(self) -> Dict:
+        loads = sum(s["loads"] for s in self.stats.values())
+        load_seconds = sum(s["total_load_seconds"] for s in self.stats.values())
+        return {
+            "loaded": list(self._loaded),
+            "loading": list(self._loading),
+            "pinned": sorted(self.pinned),
+            "aliases": self.aliases,
+            "max_loaded": self.max_loaded,
+            "max_concurrency": self.max_concurrency,
+            "model_switches": loads,
+            "avg_switch_seconds": round(load_seconds / loads, 3) if loads else None,
+            "models": {
+                model: {
+                    **stats,
+                    "total_load_seconds": round(stats["total_load_seconds"], 3),
+                    "in_flight": self._in_flight.get(model, 0),
+                    "loaded": model in self._loaded
+                }
+                for model, stats in self.stats.items()
+            }
+        }
+
+model_manager = ModelManager(WARM_MODELS, MODEL_ALIASES, MAX_LOADED_MODELS, MODEL_MAX_CONCURRENCY)
+
+# ==== PULL JOBS ==== #
+
+class PullJob:
+    def __init__(self, model: str):
+        self.id = uuid.uuid4().hex
+        self.model = model
+        self.status = "queued"
+        self.detail: Optional[str] = None
+        self.digest: Optional[str] = None
+        self.total: Optional[int] = None
+        self.completed: Optional[int] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.version = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("success", "failed")
+
+    async def update(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+        self.version += 1
+        async with self.changed:
+            self.changed.notify_all()
+
+    def to_dict(self) -> Dict:
+        percent = None
+        if self.total and self.completed is not None:
+            percent = round(100 * self.completed / self.total, 1)
+        return {
+            "job_id": self.id,
+            "model": self.model,
+            "status": self.status,
+            "detail": self.detail,
+            "digest": self.digest,
+            "total": self.total,
+            "completed": self.completed,
+            "percent": percent,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+class PullJobManager:
+    """
+    Runs Ollama pulls as background jobs. A pull for a model that is already
+    queued or downloading returns the existing job, and at most max_concurrency
+    pulls download at once so they don't starve inference of disk and network.
+    """
+    def __init__(self, max_concurrency: int, job_ttl: float):
+        self.job_ttl = job_ttl
+        self._semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        self._jobs: Dict[str, PullJob] = {}
+        self._active: Dict[str, PullJob] = {}
+
+    def submit(self, model: str) -> tuple:
+        """Return (job, created); created is False when an active job was reused."""
+        self._prune()
+        job = self._active.get(model)
+        if job is not None:
+            return job, False
+        job = PullJob(model)
+        self._jobs[job.id] = job
+        self._active[model] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job, True
+
+    def get(self, job_id: str) -> Optional[PullJob]:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: PullJob):
+        try:
+            async with self._semaphore:
+                await job.update(status="pulling")
+                # Downloads can take far longer than any request timeout
+                async with http_client.stream(
+                    "POST", "/api/pull", json={"name": job.model}, timeout=None
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if "error" in data:
+                            raise RuntimeError(data["error"])
+                        await job.update(
+                            detail=data.get("status"),
+                            digest=data.get("digest", job.digest),
+                            total=data.get("total", job.total),
+                            completed=data.get("completed", job.completed)
+                        )
+                        if data.get("status") == "success":
+                            break
+            # Ollama's final success line carries no progress fields
+            await job.update(status="success", completed=job.total, finished_at=time.time())
+        except asyncio.CancelledError:
+            await job.update(status="failed", error="cancelled", finished_at=time.time())
+            raise
+        except Exception as e:
+            await job.update(status="failed", error=str(e), finished_at=time.time())
+        finally:
+            if self._active.get(job.model) is job:
+                del self._active[job.model]
+
+    async def events(self, job: PullJob) -> AsyncIterator[str]:
+        """Server-sent progress events until the job finishes."""
+        while True:
+            seen = job.version
+            yield f"data: {json.dumps(job.to_dict())}\n\n"
+            if job.done:
+                return
+            # Wait outside the yield so a slow client never holds up the download
+            async with job.changed:
+                await job.changed.wait_for(lambda: job.version != seen)
+
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        for job_id in [
+            jid for jid, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
+
+    async def stop(self):
+        for job in list(self._active.values()):
+            if job.task is not None:
+                job.task.cancel()
+
+pull_jobs = PullJobManager(PULL_MAX_CONCURRENCY, PULL_JOB_TTL)
 
 # ==== HELPERS ==== #
 
@@ -59,25 +615,169 @@ def format_chat_prompt(messages: List[ChatMessage], assistant_prefix: str = "Ass
     prompt_parts.append(f"{assistant_prefix}:")
     return "\n".join(prompt_parts)
 
-def stream_ollama_response(payload: dict) -> Generator[str, None, None]:
+def build_chat_request(
+    model: str,
+    messages: List[ChatMessage],
+    stream: bool,
+    temperature: float = 0.7,
+    top_p: float = 0.9
+) -> tuple:
+    """Return the Ollama (path, payload) for a chat turn in the configured CHAT_API_MODE."""
+    if CHAT_API_MODE == "chat":
+        # Sending the history verbatim keeps the rendered prompt byte-identical
+        # to the previous turn's, so Ollama only evaluates the new suffix
+        # (except on the turns where trim_history cuts the session down)
+        return "/api/chat", {
+            "model": model,
+            "messages": [{"role": m.role.lower(), "content": m.content} for m in messages],
+            "stream": stream,
+            "keep_alive": model_manager.keep_alive(model),
+            "options": {"temperature": temperature, "top_p": top_p}
+        }
+    return "/api/generate", {
+        "model": model,
+        "prompt": format_chat_prompt(messages),
+        "stream": stream,
+        "keep_alive": model_manager.keep_alive(model),
+        "options": {
+            "temperature": temperature,
+            "top_p": top_p,
+            "stop": ["User:", "System:", "Assistant:"]
+        }
+    }
+
+def chunk_text(data: dict) -> str:
+    """Generated text of an /api/generate or /api/chat response object."""
+    message = data.get("message")
+    if message is not None:
+        return message.get("content", "")
+    return data.get("response", "")
+
+async def iter_ollama_chunks(payload: dict, path: str = "/api/generate") -> AsyncIterator[dict]:
+    """Yield parsed NDJSON objects from a streaming Ollama call, ending with the done object."""
+    async with http_client.stream(
+        "POST", path, json=payload, timeout=300
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield data
+                if data.get("done", False):
+                    break
+
+async def iter_ollama_tokens(payload: dict, path: str = "/api/generate") -> AsyncIterator[str]:
+    """Yield generated tokens from Ollama, raising on transport/HTTP errors."""
+    async for data in iter_ollama_chunks(payload, path):
+        token = chunk_text(data)
+        if token:
+            yield token
+
+def openai_usage(data: dict) -> Optional[dict]:
+    """OpenAI usage block from the token counts of Ollama's final response object."""
+    if "prompt_eval_count" not in data and "eval_count" not in data:
+        return None
+    prompt_tokens = data.get("prompt_eval_count", 0)
+    completion_tokens = data.get("eval_count", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+def ollama_timings(data: dict) -> Optional[dict]:
+    """Per-request timings (seconds) from Ollama's nanosecond durations."""
+    if "eval_duration" not in data:
+        return None
+    eval_seconds = data["eval_duration"] / 1e9
+    return {
+        "prompt_eval_duration": data.get("prompt_eval_duration", 0) / 1e9,
+        "eval_duration": eval_seconds,
+        "total_duration": data.get("total_duration", 0) / 1e9,
+        "tokens_per_second": round(data.get("eval_count", 0) / eval_seconds, 2) if eval_seconds else None
+    }
+
+def finish_reason(data: dict) -> str:
+    return "length" if data.get("done_reason") == "length" else "stop"
+
+def sse_event(data) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+async def stream_openai_chunks(
+    path: str,
+    payload: dict,
+    model: str,
+    include_usage: bool = False
+) -> AsyncIterator[str]:
+    """Relay an Ollama stream as OpenAI chat.completion.chunk server-sent events."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def chunk(delta: dict, reason: Optional[str] = None) -> dict:
+        return {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": reason}]
+        }
+
+    yield sse_event(chunk({"role": "assistant", "content": ""}))
     try:
-        with requests.post(
-            f"{OLLAMA_HOST}/api/generate", json=payload, stream=True, timeout=300
-        ) as response:
-            response.raise_for_status()
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        data = json.loads(line.decode("utf-8"))
-                        token = data.get("response", "")
-                        if token:
-                            yield token
-                        if data.get("done", False):
-                            break
-                    except json.JSONDecodeError:
-                        continue
+        async with model_manager.slot(payload["model"]):
+            async for data in iter_ollama_chunks(payload, path):
+                token = chunk_text(data)
+                if token:
+                    yield sse_event(chunk({"content": token}))
+                if data.get("done", False):
+                    final = chunk({}, finish_reason(data))
+                    timings = ollama_timings(data)
+                    if timings:
+                        final["timings"] = timings
+                    yield sse_event(final)
+                    usage = openai_usage(data)
+                    if include_usage and usage:
+                        yield sse_event({
+                            "id": completion_id,
+                            "object": "chat.completion.chunk",
+                            "created": created,
+                            "model": model,
+                            "choices": [],
+                            "usage": usage
+                        })
+    except Exception as e:
+        yield sse_event({"error": {"message": str(e), "type": "server_error"}})
+    yield "data: [DONE]\n\n"
+
+async def stream_chat_turn(
+    path: str,
+    payload: dict,
+    session_id: str,
+    new_messages: List[ChatMessage]
+) -> AsyncIterator[str]:
+    """
+    Stream a chat turn and commit it to the session once generation finishes.
+    A turn is stored only when the stream completes: if the backend fails or
+    the client disconnects mid-stream, neither the user messages nor the
+    partial reply are saved, so the client can simply retry the turn.
+    """
+    reply_parts = []
+    try:
+        async with model_manager.slot(payload["model"]):
+            async for token in iter_ollama_tokens(payload, path):
+                reply_parts.append(token)
+                yield token
     except Exception as e:
         yield f"\n[Error] {str(e)}"
+        return
+
+    reply = "".join(reply_parts).strip()
+    await chat_memory.append(
+        session_id, new_messages + [ChatMessage(role="assistant", content=reply)]
+    )
 
 # ==== API ENDPOINTS ==== #
 
@@ -85,60 +785,78 @@ def stream_ollama_response(payload: dict) -> Generator[str, None, None]:
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    return {"model_manager": model_manager.snapshot()}
+
 @app.get("/models")
 async def list_models():
     try:
-        response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=30)
+        response = await http_client.get("/api/tags", timeout=30)
         response.raise_for_status()
         return response.json()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
-@app.post("/pull")
+@app.post("/pull", status_code=202)
 async def pull_model(request: PullRequest):
-    try:
-        response = requests.post(
-            f"{OLLAMA_HOST}/api/pull",
-            json={"name": request.name},
-            timeout=300,
-            stream=True
-        )
-        response.raise_for_status()
-        final_response = None
-        for line in response.iter_lines():
-            if line:
-                try:
-                    data = json.loads(line.decode('utf-8'))
-                    final_response = data
-                    if data.get('status') == 'success':
-                        break
-                except json.JSONDecodeError:
-                    continue
-        return final_response or {"status": "completed", "message": f"Model {request.name} pulled"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    job, created = pull_jobs.submit(request.name)
+    return {**job.to_dict(), "deduplicated": not created}
+
+@app.get("/pull/{job_id}")
+async def pull_status(job_id: str):
+    job = pull_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Pull job {job_id} not found")
+    return job.to_dict()
+
+@app.get("/pull/{job_id}/events")
+async def pull_events(job_id: str):
+    job = pull_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Pull job {job_id} not found")
+    return StreamingResponse(
+        pull_jobs.events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.delete("/models/{model_name}")
 async def delete_model(model_name: str):
     try:
-        response = requests.delete(
-            f"{OLLAMA_HOST}/api/delete",
+        # httpx only sends a body on DELETE through the generic request method
+        response = await http_client.request(
+            "DELETE",
+            "/api/delete",
             json={"name": model_name},
             timeout=30
         )
         response.raise_for_status()
+        model_manager.forget(model_name)
         return {"message": f"Model {model_name} deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    await chat_memory.delete(session_id)
+    return {"message": f"Session {session_id} deleted"}
+
 @app.post("/generate")
 async def generate(request: GenerateRequest):
     try:
-        response = requests.post(
-            f"{OLLAMA_HOST}/api/generate",
-            json={"model": request.model, "prompt": request.prompt, "stream": request.stream},
-            timeout=120
-        )
+        model = model_manager.resolve(request.model)
+        async with model_manager.slot(model):
+            response = await http_client.post(
+                "/api/generate",
+                json={
+                    "model": model,
+                    "prompt": request.prompt,
+                    "stream": request.stream,
+                    "keep_alive": model_manager.keep_alive(model)
+                },
+                timeout=120
+            )
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -147,33 +865,26 @@ async def generate(request: GenerateRequest):
 @app.post("/chatinference")
 async def chat_inference(request: ChatInferenceRequest):
     try:
-        memory = chat_memory[request.session_id]
+        memory = await chat_memory.get(request.session_id)
         full_history = memory + request.CHAT_INPUT
 
-        prompt = format_chat_prompt(full_history)
-        payload = {
-            "model": request.model,
-            "prompt": prompt,
-            "stream": request.stream,
-            "options": {
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "stop": ["User:", "System:", "Assistant:"]
-            }
-        }
+        model = model_manager.resolve(request.model)
+        path, payload = build_chat_request(model, full_history, request.stream)
 
         if request.stream:
+            # The stream takes its model slot itself, so it is held until the last token
             return StreamingResponse(
-                stream_ollama_response(payload),
+                stream_chat_turn(path, payload, request.session_id, request.CHAT_INPUT),
                 media_type="text/plain"
             )
 
-        response = requests.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=120)
+        async with model_manager.slot(model):
+            response = await http_client.post(path, json=payload, timeout=120)
         response.raise_for_status()
-        reply = response.json().get("response", "").strip()
+        reply = chunk_text(response.json()).strip()
 
         updated = request.CHAT_INPUT + [ChatMessage(role="assistant", content=reply)]
-        chat_memory[request.session_id] += updated
+        await chat_memory.append(request.session_id, updated)
 
         full_response = [
             {"role": m.role, "content": m.content}
@@ -189,38 +900,43 @@ async def chat_inference(request: ChatInferenceRequest):
 async def openai_compatible_chat(request: OpenAIChatRequest):
     try:
         messages = [ChatMessage(role=m.role, content=m.content) for m in request.messages]
-        prompt = format_chat_prompt(messages)
-        payload = {
-            "model": request.model,
-            "prompt": prompt,
-            "stream": request.stream,
-            "options": {
-                "temperature": request.temperature,
-                "top_p": request.top_p,
-                "stop": ["User:", "System:", "Assistant:"]
-            }
-        }
+        model = model_manager.resolve(request.model)
+        path, payload = build_chat_request(
+            model, messages, request.stream, request.temperature, request.top_p
+        )
 
         if request.stream:
+            include_usage = bool((request.stream_options or {}).get("include_usage"))
             return StreamingResponse(
-                stream_ollama_response(payload),
-                media_type="text/plain"
+                stream_openai_chunks(path, payload, request.model, include_usage),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
             )
 
-        response = requests.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=120)
+        async with model_manager.slot(model):
+            response = await http_client.post(path, json=payload, timeout=120)
         response.raise_for_status()
-        reply = response.json().get("response", "").strip()
+        data = response.json()
+        reply = chunk_text(data).strip()
 
-        return {
-            "id": "chatcmpl-openai-compatible",
+        completion = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
             "object": "chat.completion",
+            "created": int(time.time()),
             "model": request.model,
             "choices": [{
                 "index": 0,
                 "message": {"role": "assistant", "content": reply},
-                "finish_reason": "stop"
+                "finish_reason": finish_reason(data)
             }]
         }
+        usage = openai_usage(data)
+        if usage:
+            completion["usage"] = usage
+        timings = ollama_timings(data)
+        if timings:
+            completion["timings"] = timings
+        return completion
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI-compatible chat error: {str(e)}")
\ No newline at end of file
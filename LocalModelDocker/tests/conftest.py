@@ -0,0 +1,51 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+import pytest
+
+# The server modules are imported as top-level modules, as in the container
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeOllama:
+    """In-process stand-in for the Ollama HTTP API with a fixed per-request latency"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content) if request.content else {}
+        self.requests.append((request.url.path, body))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        if request.url.path == "/api/ps":
+            return httpx.Response(200, json={"models": []})
+        if request.url.path == "/api/chat":
+            return httpx.Response(200, json={"message": {"role": "assistant", "content": "hi"}, "done": True})
+        return httpx.Response(200, json={"model": body.get("model"), "response": "hi", "done": True})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(base_url="http://ollama.test", transport=httpx.MockTransport(self.handler))
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    """Factory installing a FakeOllama as main.http_client; call it inside the running event loop"""
+    import main
+
+    def install(latency: float = 0.0) -> FakeOllama:
+        fake = FakeOllama(latency)
+        monkeypatch.setattr(main, "http_client", fake.client())
+        return fake
+
+    return install
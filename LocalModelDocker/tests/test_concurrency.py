@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+import httpx
+
+import main
+
+
+def test_parallel_generate_calls_overlap(fake_ollama, monkeypatch):
+    latency = 0.2
+    calls = 8
+
+    async def scenario():
+        fake = fake_ollama(latency=latency)
+        monkeypatch.setattr(main, "model_manager", main.ModelManager([], {}, max_loaded=2, max_concurrency=calls))
+        await main.model_manager.ensure_loaded("m")
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://wrapper.test") as client:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                client.post("/generate", json={"model": "m", "prompt": f"p{i}"}) for i in range(calls)
+            ))
+            elapsed = time.perf_counter() - started
+        return fake, responses, elapsed
+
+    fake, responses, elapsed = asyncio.run(scenario())
+    assert all(r.status_code == 200 for r in responses)
+    assert fake.max_in_flight == calls
+    # About max(latency), far below the sum(latency) a blocking client would take
+    assert elapsed < latency * 3
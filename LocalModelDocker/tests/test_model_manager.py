@@ -0,0 +1,30 @@
+import asyncio
+
+from main import ModelManager
+
+
+def test_concurrent_cold_loads_stay_within_max_loaded(fake_ollama):
+    async def scenario():
+        fake = fake_ollama(latency=0.05)
+        manager = ModelManager([], {}, max_loaded=2, max_concurrency=4)
+        manager._loaded.update({"x": None, "y": None})
+        await asyncio.gather(manager.ensure_loaded("a"), manager.ensure_loaded("b"))
+        return manager, fake
+
+    manager, fake = asyncio.run(scenario())
+    assert sorted(manager._loaded) == ["a", "b"]
+    unloaded = sorted(body["model"] for _, body in fake.requests if body.get("keep_alive") == 0)
+    assert unloaded == ["x", "y"]
+
+
+def test_busy_and_pinned_models_are_not_evicted(fake_ollama):
+    async def scenario():
+        fake_ollama()
+        manager = ModelManager(["p"], {}, max_loaded=2, max_concurrency=4)
+        manager._loaded.update({"p": None, "busy": None})
+        manager._in_flight["busy"] = 1
+        await manager.ensure_loaded("a")
+        return manager
+
+    manager = asyncio.run(scenario())
+    assert set(manager._loaded) == {"p", "busy", "a"}
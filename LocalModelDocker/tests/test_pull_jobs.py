@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+import httpx
+
+import main
+
+
+def test_successful_pull_reports_full_progress(monkeypatch):
+    lines = [
+        {"status": "pulling manifest"},
+        {"status": "pulling abc", "digest": "sha256:abc", "total": 1000, "completed": 500},
+        {"status": "verifying sha256 digest"},
+        {"status": "success"},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = "".join(json.dumps(line) + "\n" for line in lines)
+        return httpx.Response(200, content=body.encode())
+
+    async def scenario():
+        client = httpx.AsyncClient(base_url="http://ollama.test", transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(main, "http_client", client)
+        jobs = main.PullJobManager(max_concurrency=1, job_ttl=60)
+        job, created = jobs.submit("qwen2.5:0.5b")
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+    data = job.to_dict()
+    assert data["status"] == "success"
+    assert data["completed"] == data["total"] == 1000
+    assert data["percent"] == 100.0
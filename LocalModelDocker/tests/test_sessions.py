@@ -0,0 +1,59 @@
+import asyncio
+
+import main
+from main import ChatMessage, SQLiteSessionStore, trim_history
+
+
+def turn(i: int):
+    return [ChatMessage(role="user", content=f"question {i}"), ChatMessage(role="assistant", content=f"answer {i}")]
+
+
+def test_trim_history_drops_whole_turns(monkeypatch):
+    monkeypatch.setattr(main, "SESSION_MAX_TURNS", 4)
+    messages = [ChatMessage(role="system", content="be brief")]
+    for i in range(5):
+        messages += turn(i)
+    trimmed = trim_history(messages)
+    assert [m.content for m in trimmed] == ["be brief", "question 3", "answer 3", "question 4", "answer 4"]
+
+
+def test_trim_history_never_keeps_an_orphan_reply(monkeypatch):
+    monkeypatch.setattr(main, "SESSION_MAX_TURNS", 100)
+    # Budget fits the last turn but not the long question of the one before
+    monkeypatch.setattr(main, "SESSION_MAX_TOKENS", 20)
+    messages = [ChatMessage(role="user", content="x" * 200), ChatMessage(role="assistant", content="ok")] + turn(1)
+    trimmed = trim_history(messages)
+    assert trimmed[0].role == "user"
+    assert [m.content for m in trimmed] == ["question 1", "answer 1"]
+
+
+def test_sqlite_concurrent_appends_keep_every_turn(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SESSION_MAX_TURNS", 1000)
+    monkeypatch.setattr(main, "SESSION_MAX_TOKENS", 10 ** 6)
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=3600, max_sessions=10)
+
+    async def scenario():
+        await asyncio.gather(*(store.append("s", turn(i)) for i in range(50)))
+        return await store.get("s")
+
+    try:
+        history = asyncio.run(scenario())
+    finally:
+        store.close()
+    assert sorted(m.content for m in history if m.role == "user") == sorted(f"question {i}" for i in range(50))
+
+
+def test_history_prefix_is_stable_between_trims(monkeypatch):
+    monkeypatch.setattr(main, "SESSION_MAX_TURNS", 20)
+    monkeypatch.setattr(main, "SESSION_MAX_TOKENS", 3000)
+    monkeypatch.setattr(main, "SESSION_TRIM_TARGET", 0.5)
+    history = []
+    rewrites = 0
+    for i in range(50):
+        updated = trim_history(history + turn(i))
+        if updated[:len(history)] != history:
+            rewrites += 1
+        assert len(updated) <= 2 * 20
+        history = updated
+    # Trimmed at turns 21, 31 and 41 only; every other prompt extends the previous one
+    assert rewrites == 3
@@ -1,8 +1,163 @@
 # constants.py
 import os
 
-# Suitable for local vLLM directory structure too with \app\models\ 
-LOCAL_DIRECTORY = r"D:\JYN\EZ\EGITIM\LLM_Model_Registry\HuggingFaceRepo\app\models\\"
+# Suitable for local vLLM directory structure too with \app\models\ (download_model.py target, MODEL_PATH overrides)
+LOCAL_DIRECTORY = os.getenv("MODEL_PATH", r"D:\JYN\EZ\EGITIM\LLM_Model_Registry\HuggingFaceRepo\app\models\\")
 
 # Use default model name or take from CLI args
-MODEL_NAME = "Qwen/Qwen2.5-0.5B-Instruct"
\ No newline at end of file
+MODEL_NAME = "Qwen/Qwen2.5-0.5B-Instruct"
+
+# Engine: "vllm" (AsyncLLMEngine on the GPU) or "fake" (CPU stand-in for testing the scheduler)
+ENGINE_BACKEND = os.getenv("ENGINE_BACKEND", "vllm")
+FAKE_ENGINE_STEP_SECONDS = float(os.getenv("FAKE_ENGINE_STEP_SECONDS", "0.02"))
+FAKE_ENGINE_LOAD_SECONDS = float(os.getenv("FAKE_ENGINE_LOAD_SECONDS", "0"))
+
+# Request queue in front of the engine: requests submitted to the engine at once
+# (vLLM batches these together), how many more may wait, and for how long
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "256"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "512"))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "30"))
+# Share of those engine slots /v1/batch items may hold; waiting chat requests always get freed slots first
+BATCH_MAX_CONCURRENCY_SHARE = float(os.getenv("BATCH_MAX_CONCURRENCY_SHARE", "0.75"))
+
+# Rendered chat-template prompts / token ids kept in the prompt cache
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1024"))
+
+# /v1/batch: maximum chat requests per batch
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Startup: requests sent to the model while warming up before readiness (0 disables),
+# Retry-After returned while not ready, and whether a failed load exits the process
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "4"))
+WARMUP_MAX_TOKENS = int(os.getenv("WARMUP_MAX_TOKENS", "16"))
+WARMUP_PROMPT = os.getenv("WARMUP_PROMPT", "Hello! Please introduce yourself.")
+STARTUP_RETRY_AFTER = int(os.getenv("STARTUP_RETRY_AFTER", "10"))
+EXIT_ON_LOAD_FAILURE = os.getenv("EXIT_ON_LOAD_FAILURE", "true").lower() == "true"
+
+# ==== ENGINE CONFIG ==== #
+# vLLM engine arguments, resolved as: defaults < named profile < environment.
+# ENGINE_PROFILE picks a profile, either from ENGINE_CONFIG_FILE (YAML with a top-level
+# "profiles" mapping) or one of the built-in profiles below; ENGINE_<KEY> env vars
+# (e.g. ENGINE_MAX_NUM_SEQS=64) override individual values on top of the profile.
+
+ENGINE_DEFAULTS = {
+    "max_model_len": 2048,
+    "gpu_memory_utilization": 0.8,
+    "dtype": "float16",
+    "enable_prefix_caching": False,
+    "enable_chunked_prefill": False,
+    "max_num_seqs": 256,
+    "max_num_batched_tokens": None,  # vLLM picks a value from max_model_len
+    "quantization": None,
+    "tensor_parallel_size": 1,
+}
+
+ENGINE_PROFILES = {
+    "default": {},
+    # Few concurrent sequences and a small prefill budget per step, so decoding
+    # requests are not stalled behind long prompts
+    "latency": {
+        "max_num_seqs": 16,
+        "enable_prefix_caching": True,
+        "enable_chunked_prefill": True,
+        "max_num_batched_tokens": 512,
+    },
+    # Large batches and more KV cache for aggregate tokens/sec
+    "throughput": {
+        "gpu_memory_utilization": 0.9,
+        "max_num_seqs": 256,
+        "enable_prefix_caching": True,
+        "enable_chunked_prefill": True,
+        "max_num_batched_tokens": 8192,
+    },
+}
+
+ENGINE_DTYPES = {"auto", "half", "float16", "bfloat16", "float", "float32"}
+ENGINE_QUANTIZATIONS = {
+    "awq", "awq_marlin", "gptq", "gptq_marlin", "marlin", "fp8",
+    "bitsandbytes", "gguf", "compressed-tensors", "squeezellm",
+}
+
+def _parse_env_value(key: str, raw: str):
+    default = ENGINE_DEFAULTS[key]
+    if raw.lower() in ("", "none", "null"):
+        return None
+    if isinstance(default, bool):
+        return raw.lower() in ("1", "true", "yes", "on")
+    try:
+        if key == "gpu_memory_utilization":
+            return float(raw)
+        if isinstance(default, int) or key == "max_num_batched_tokens":
+            return int(raw)
+    except ValueError:
+        raise ValueError(f"ENGINE_{key.upper()}={raw!r} is not a valid number")
+    return raw
+
+def _load_profile_file(path: str) -> dict:
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError("ENGINE_CONFIG_FILE requires PyYAML (pip install pyyaml)")
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    profiles = data.get("profiles", {})
+    if not isinstance(profiles, dict):
+        raise ValueError(f"{path}: 'profiles' must be a mapping of profile name to engine settings")
+    return profiles
+
+def validate_engine_config(config: dict) -> dict:
+    unknown = set(config) - set(ENGINE_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown engine settings: {', '.join(sorted(unknown))}")
+    errors = []
+    if not isinstance(config["max_model_len"], int) or config["max_model_len"] <= 0:
+        errors.append("max_model_len must be a positive integer")
+    if not 0 < float(config["gpu_memory_utilization"]) <= 1:
+        errors.append("gpu_memory_utilization must be in (0, 1]")
+    if config["dtype"] not in ENGINE_DTYPES:
+        errors.append(f"dtype must be one of {sorted(ENGINE_DTYPES)}")
+    if config["quantization"] is not None and config["quantization"] not in ENGINE_QUANTIZATIONS:
+        errors.append(f"quantization must be one of {sorted(ENGINE_QUANTIZATIONS)} or unset")
+    if not isinstance(config["max_num_seqs"], int) or config["max_num_seqs"] <= 0:
+        errors.append("max_num_seqs must be a positive integer")
+    if not isinstance(config["tensor_parallel_size"], int) or config["tensor_parallel_size"] <= 0:
+        errors.append("tensor_parallel_size must be a positive integer")
+    batched = config["max_num_batched_tokens"]
+    if batched is not None:
+        if not isinstance(batched, int) or batched <= 0:
+            errors.append("max_num_batched_tokens must be a positive integer or unset")
+        elif batched < config["max_num_seqs"]:
+            errors.append("max_num_batched_tokens must be at least max_num_seqs")
+        elif not config["enable_chunked_prefill"] and batched < config["max_model_len"]:
+            # Without chunked prefill a whole prompt must fit in one step
+            errors.append("max_num_batched_tokens must be at least max_model_len unless enable_chunked_prefill is set")
+    if errors:
+        raise ValueError("Invalid engine config: " + "; ".join(errors))
+    return config
+
+def resolve_engine_config(profile: str, config_file: str = "") -> dict:
+    profiles = dict(ENGINE_PROFILES)
+    if config_file:
+        profiles.update(_load_profile_file(config_file))
+    if profile not in profiles:
+        raise ValueError(f"Unknown ENGINE_PROFILE '{profile}'; available: {', '.join(sorted(profiles))}")
+    config = {**ENGINE_DEFAULTS, **(profiles[profile] or {})}
+    for key in ENGINE_DEFAULTS:
+        raw = os.getenv(f"ENGINE_{key.upper()}")
+        if raw is not None:
+            config[key] = _parse_env_value(key, raw)
+    return validate_engine_config(config)
+
+ENGINE_PROFILE = os.getenv("ENGINE_PROFILE", "default")
+ENGINE_CONFIG_FILE = os.getenv("ENGINE_CONFIG_FILE", "")
+ENGINE_CONFIG = resolve_engine_config(ENGINE_PROFILE, ENGINE_CONFIG_FILE)
+
+# LoRA adapters served on the base model, selected by the request's "model" field:
+# "name=path,..." and/or a directory whose subdirectories are adapters.
+# At most LORA_MAX_RESIDENT stay loaded (least recently used is unloaded first),
+# LORA_MAX_PER_BATCH can be active in one engine step
+LORA_ADAPTERS = os.getenv("LORA_ADAPTERS", "")
+LORA_DIR = os.getenv("LORA_DIR", "")
+LORA_MAX_RESIDENT = int(os.getenv("LORA_MAX_RESIDENT", "4"))
+LORA_MAX_PER_BATCH = int(os.getenv("LORA_MAX_PER_BATCH", "2"))
+LORA_MAX_RANK = int(os.getenv("LORA_MAX_RANK", "16"))
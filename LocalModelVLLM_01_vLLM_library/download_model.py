@@ -1,62 +1,274 @@
 #!/usr/bin/env python3
 """
-Script to download a specified model from HuggingFace to a local directory.
-Uses the `huggingface_hub` library.
+Script to download models from HuggingFace to a local directory.
+
+Several models are downloaded in parallel, each with concurrent file
+fetches that share an optional bandwidth cap. Files are written as
+`<name>.incomplete` and resumed with HTTP range requests, verified against
+the hub's checksums (sha256 for LFS files, git blob sha1 otherwise) and
+skipped when already present. Every downloaded model is recorded in the
+directory's models_index.json, which the server reads to find models.
+
+Usage:
+    python download_model.py [MODEL ...] [--dest DIR] [--revision REV]
+                             [--parallel-models N] [--max-workers N]
+                             [--max-bandwidth MBPS] [--endpoint URL]
 """
 
 import os
 import sys
+import json
+import time
+import hashlib
 import logging
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
 import constants as c
-from huggingface_hub import snapshot_download
+from model_index import load_index, model_subdir, record_model
 
 # === Configuration ===
 LOCAL_DIRECTORY = c.LOCAL_DIRECTORY
+HF_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co")
+CHUNK_SIZE = 1024 * 1024
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
-def download_model(model_name: str, local_dir: str) -> bool:
+class BandwidthLimiter:
+    """Token bucket shared by all download threads; a rate of 0 means unlimited."""
+
+    def __init__(self, bytes_per_second: float):
+        self.rate = bytes_per_second
+        self.tokens = bytes_per_second
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount: int):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            # Sleep off the debt while holding the lock so threads queue fairly
+            if self.tokens < 0:
+                time.sleep(-self.tokens / self.rate)
+
+
+class HubClient:
+    """Minimal HuggingFace Hub HTTP client (works against any mirror or local stand-in)."""
+
+    def __init__(self, endpoint: str, token: Optional[str] = None, timeout: float = 60):
+        self.endpoint = endpoint.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, url: str, headers: Optional[Dict[str, str]] = None):
+        request = urllib.request.Request(url, headers=headers or {})
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def model_info(self, model_name: str, revision: str) -> Dict:
+        """Resolved commit sha plus every file's name, size and checksum"""
+        url = (
+            f"{self.endpoint}/api/models/{model_name}/revision/"
+            f"{urllib.parse.quote(revision, safe='')}?blobs=true"
+        )
+        with self._request(url) as response:
+            data = json.load(response)
+        files = []
+        for sibling in data.get("siblings", []):
+            lfs = sibling.get("lfs") or {}
+            files.append({
+                "name": sibling["rfilename"],
+                "size": lfs.get("size", sibling.get("size")),
+                "sha256": lfs.get("sha256"),
+                "git_sha1": None if lfs else sibling.get("blobId"),
+            })
+        return {"sha": data.get("sha", revision), "files": files}
+
+    def open_file(self, model_name: str, revision: str, filename: str, offset: int = 0):
+        url = f"{self.endpoint}/{model_name}/resolve/{revision}/{urllib.parse.quote(filename)}"
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        return self._request(url, headers)
+
+
+def file_checksum(path: str, expected: Dict) -> Optional[str]:
+    """Hex digest of `path` in whichever form the hub reported for it"""
+    if expected.get("sha256"):
+        digest = hashlib.sha256()
+    elif expected.get("git_sha1"):
+        # Git blob id: sha1 over a "blob <size>\0" header and the contents
+        digest = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode())
+    else:
+        return None
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_valid(path: str, expected: Dict) -> bool:
+    if not os.path.isfile(path):
+        return False
+    if expected.get("size") is not None and os.path.getsize(path) != expected["size"]:
+        return False
+    want = expected.get("sha256") or expected.get("git_sha1")
+    return want is None or file_checksum(path, expected) == want
+
+
+def fetch_file(
+    client: HubClient,
+    model_name: str,
+    revision: str,
+    target_dir: str,
+    expected: Dict,
+    limiter: BandwidthLimiter,
+    known: Optional[Dict] = None
+) -> str:
+    """Download one file unless it is already present and valid; returns its status"""
+    path = os.path.join(target_dir, expected["name"])
+    # Unchanged since the index recorded it as verified: skip without re-hashing
+    if known and os.path.isfile(path) and known.get("size") == expected.get("size") \
+            and known.get("checksum") == (expected.get("sha256") or expected.get("git_sha1")) \
+            and os.path.getsize(path) == expected.get("size") \
+            and known.get("mtime") == int(os.path.getmtime(path)):
+        return "cached"
+    if is_valid(path, expected):
+        return "verified"
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.incomplete"
+    offset = os.path.getsize(partial) if os.path.isfile(partial) else 0
+    if expected.get("size") is not None and offset > expected["size"]:
+        offset = 0
+
+    try:
+        response = client.open_file(model_name, revision, expected["name"], offset)
+    except urllib.error.HTTPError as e:
+        if e.code != 416:  # range not satisfiable: the partial file is already complete
+            raise
+        response = None
+    if response is not None:
+        with response:
+            # A server that ignores the range sends the whole file again
+            mode = "ab" if offset and response.status == 206 else "wb"
+            with open(partial, mode) as f:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    limiter.consume(len(chunk))
+                    f.write(chunk)
+
+    if not is_valid(partial, expected):
+        os.remove(partial)
+        raise ValueError(f"Checksum or size mismatch for {expected['name']}")
+    os.replace(partial, path)
+    return "resumed" if offset else "downloaded"
+
+
+def download_model(
+    model_name: str,
+    local_dir: str,
+    revision: str = "main",
+    client: Optional[HubClient] = None,
+    max_workers: int = 4,
+    limiter: Optional[BandwidthLimiter] = None
+) -> bool:
     """Download model from HuggingFace Hub into local directory."""
+    client = client or HubClient(HF_ENDPOINT, os.getenv("HF_TOKEN"))
+    limiter = limiter or BandwidthLimiter(0)
     try:
-        logger.info(f"📦 Starting download of '{model_name}' to '{local_dir}'")
+        logger.info(f"📦 Starting download of '{model_name}' ({revision}) to '{local_dir}'")
+        info = client.model_info(model_name, revision)
 
         # Build HuggingFace-style directory name
-        model_subdir = f"models--{model_name.replace('/', '--')}"
-        target_path = os.path.join(local_dir, model_subdir)
-
+        target_path = os.path.join(local_dir, model_subdir(model_name))
         os.makedirs(target_path, exist_ok=True)
 
-        # Download model snapshot
-        snapshot_download(
-            repo_id=model_name,
-            local_dir=target_path,
-            local_dir_use_symlinks=False,  # Safer on Windows
-            resume_download=True
-        )
+        index = load_index(local_dir) or {}
+        previous = index.get("models", {}).get(model_name, {})
+        known_files = previous.get("files", {}) if previous.get("revision") == info["sha"] else {}
+
+        statuses: Dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(
+                    fetch_file, client, model_name, info["sha"], target_path,
+                    expected, limiter, known_files.get(expected["name"])
+                ): expected["name"]
+                for expected in info["files"]
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                statuses[name] = future.result()
+                logger.info(f"  {model_name}: {name} {statuses[name]}")
 
-        logger.info(f"✅ Successfully downloaded '{model_name}' to '{local_dir}'")
+        files = {}
+        for expected in info["files"]:
+            path = os.path.join(target_path, expected["name"])
+            files[expected["name"]] = {
+                "size": os.path.getsize(path),
+                "checksum": expected.get("sha256") or expected.get("git_sha1"),
+                "mtime": int(os.path.getmtime(path)),
+            }
+        record_model(local_dir, model_name, {
+            "path": model_subdir(model_name),
+            "revision": info["sha"],
+            "requested_revision": revision,
+            "size": sum(f["size"] for f in files.values()),
+            "files": files,
+        })
+
+        fetched = sum(1 for s in statuses.values() if s in ("downloaded", "resumed"))
+        logger.info(
+            f"✅ Successfully downloaded '{model_name}' to '{local_dir}' "
+            f"({fetched} fetched, {len(statuses) - fetched} already present)"
+        )
         return True
 
     except Exception as e:
-        logger.error(f"❌ Failed to download model: {e}")
+        logger.error(f"❌ Failed to download model '{model_name}': {e}")
         return False
 
 
-def main():
-    # Use default model name or take from CLI args
-    model_name = c.MODEL_NAME
-    if len(sys.argv) > 1:
-        model_name = sys.argv[1]
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Download models from the HuggingFace Hub")
+    parser.add_argument("models", nargs="*", default=[c.MODEL_NAME], help="Model ids (default: constants.MODEL_NAME)")
+    parser.add_argument("--dest", default=LOCAL_DIRECTORY, help="Model directory")
+    parser.add_argument("--revision", default="main", help="Branch, tag or commit to download")
+    parser.add_argument("--parallel-models", type=int, default=2, help="Models downloaded at once")
+    parser.add_argument("--max-workers", type=int, default=4, help="Concurrent file downloads per model")
+    parser.add_argument("--max-bandwidth", type=float, default=0, help="Total bandwidth cap in MB/s (0 = unlimited)")
+    parser.add_argument("--endpoint", default=HF_ENDPOINT, help="Hub endpoint (mirror or local file server)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
 
-    logger.info(f"📁 Target download directory: {LOCAL_DIRECTORY}")
-    logger.info(f"🧠 Model to download: {model_name}")
+    logger.info(f"📁 Target download directory: {args.dest}")
+    logger.info(f"🧠 Models to download: {', '.join(args.models)}")
 
-    success = download_model(model_name, LOCAL_DIRECTORY)
+    client = HubClient(args.endpoint, os.getenv("HF_TOKEN"))
+    limiter = BandwidthLimiter(args.max_bandwidth * 1024 * 1024)
+    with ThreadPoolExecutor(max_workers=max(args.parallel_models, 1)) as pool:
+        results = list(pool.map(
+            lambda model: download_model(
+                model, args.dest, args.revision, client, args.max_workers, limiter
+            ),
+            args.models
+        ))
 
-    if success:
+    if all(results):
         logger.info("🎉 Model download completed successfully!")
         return 0
     else:
@@ -65,4 +277,4 @@ def main():
 
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
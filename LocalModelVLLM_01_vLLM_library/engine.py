@@ -0,0 +1,461 @@
+# engine.py
+"""
+Inference engine layer for the vLLM library server.
+
+The server talks to an `Engine` (vLLM's AsyncLLMEngine in production, or a
+CPU-only `FakeEngine` that imitates continuous batching) through a
+`RequestScheduler`, which bounds how many requests are in the engine and how
+many may wait for a slot.
+"""
+
+import asyncio
+import inspect
+from abc import ABC, abstractmethod
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GenerationParams:
+    """Engine-agnostic sampling parameters (mapped to vllm.SamplingParams)."""
+    temperature: float = 0.7
+    top_p: float = 0.9
+    max_tokens: int = 512
+    stop: List[str] = field(default_factory=list)
+    n: int = 1
+    best_of: Optional[int] = None
+    seed: Optional[int] = None
+
+
+@dataclass
+class Adapter:
+    """A LoRA adapter served on top of the base model."""
+    name: str
+    id: int  # positive integer id the engine tracks the adapter by
+    path: str
+
+
+@dataclass
+class Completion:
+    index: int
+    text: str  # cumulative text generated so far
+    token_count: int
+    finish_reason: Optional[str] = None
+
+
+@dataclass
+class EngineOutput:
+    request_id: str
+    prompt_tokens: int
+    completions: List[Completion]
+    finished: bool
+
+
+class QueueFullError(Exception):
+    """Raised when the scheduler's waiting queue is full or the wait timed out."""
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Engine(ABC):
+    """Interface every engine implements."""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def get_tokenizer(self):
+        """The model's HuggingFace tokenizer, or None if the engine has none."""
+        return None
+
+    @abstractmethod
+    def generate(
+        self,
+        prompt: str,
+        params: GenerationParams,
+        request_id: str,
+        prompt_token_ids: Optional[List[int]] = None,
+        adapter: Optional[Adapter] = None
+    ) -> AsyncIterator[EngineOutput]:
+        """Yield cumulative outputs for the request until one is finished."""
+
+    @abstractmethod
+    async def abort(self, request_id: str):
+        """Stop a running request and free its engine resources."""
+
+    async def remove_adapter(self, adapter: Adapter):
+        """Unload a LoRA adapter; it is loaded again by the next request using it."""
+        pass
+
+
+class VLLMEngine(Engine):
+    """AsyncLLMEngine wrapper; vLLM batches all in-flight requests on the GPU."""
+
+    def __init__(self, engine_kwargs: Dict):
+        self.engine_kwargs = engine_kwargs
+        self.engine = None
+
+    async def start(self):
+        from vllm import AsyncEngineArgs, AsyncLLMEngine
+
+        # Loading weights and profiling memory blocks for a long time; keep the event loop free
+        self.engine = await asyncio.to_thread(
+            AsyncLLMEngine.from_engine_args, AsyncEngineArgs(**self.engine_kwargs)
+        )
+
+    def sampling_params(self, params: GenerationParams):
+        from vllm import SamplingParams
+
+        extra = {"best_of": params.best_of} if params.best_of is not None else {}
+        return SamplingParams(
+            temperature=params.temperature,
+            top_p=params.top_p,
+            max_tokens=params.max_tokens,
+            stop=params.stop or None,
+            n=params.n,
+            seed=params.seed,
+            **extra
+        )
+
+    async def get_tokenizer(self):
+        tokenizer = self.engine.get_tokenizer()
+        # Older vLLM releases return the tokenizer directly instead of a coroutine
+        if inspect.isawaitable(tokenizer):
+            tokenizer = await tokenizer
+        return tokenizer
+
+    async def generate(
+        self,
+        prompt: str,
+        params: GenerationParams,
+        request_id: str,
+        prompt_token_ids: Optional[List[int]] = None,
+        adapter: Optional[Adapter] = None
+    ) -> AsyncIterator[EngineOutput]:
+        # Pre-tokenized prompts skip vLLM's own tokenization
+        inputs = {"prompt_token_ids": prompt_token_ids} if prompt_token_ids else prompt
+        lora_request = None
+        if adapter is not None:
+            from vllm.lora.request import LoRARequest
+
+            lora_request = LoRARequest(adapter.name, adapter.id, adapter.path)
+        async for output in self.engine.generate(
+            inputs, self.sampling_params(params), request_id, lora_request=lora_request
+        ):
+            yield EngineOutput(
+                request_id=request_id,
+                prompt_tokens=len(output.prompt_token_ids or []),
+                completions=[
+                    Completion(
+                        index=c.index,
+                        text=c.text,
+                        token_count=len(c.token_ids),
+                        finish_reason=c.finish_reason
+                    )
+                    for c in output.outputs
+                ],
+                finished=output.finished
+            )
+
+    async def abort(self, request_id: str):
+        await self.engine.abort(request_id)
+
+    async def remove_adapter(self, adapter: Adapter):
+        # AsyncLLMEngine only exposes remove_lora in newer releases
+        remove_lora = getattr(self.engine, "remove_lora", None) or self.engine.engine.remove_lora
+        result = remove_lora(adapter.id)
+        if inspect.isawaitable(result):
+            await result
+
+
+class FakeEngine(Engine):
+    """
+    CPU stand-in that mimics continuous batching: every `step_seconds` one
+    token is produced for each running request (up to `max_num_seqs`), and
+    new requests join the batch at the next step instead of waiting for the
+    current ones to finish. `max_batch_seen` records the largest step batch.
+    """
+
+    def __init__(self, step_seconds: float = 0.02, max_num_seqs: int = 256, load_seconds: float = 0.0):
+        self.step_seconds = step_seconds
+        self.load_seconds = load_seconds
+        self.max_num_seqs = max_num_seqs
+        self.max_batch_seen = 0
+        self.steps = 0
+        self._requests: Dict[str, Dict] = {}
+        self.loaded_adapters: Dict[int, str] = {}
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await asyncio.sleep(self.load_seconds)  # simulated weight loading
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+
+    async def _run(self):
+        while True:
+            if not self._requests:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await asyncio.sleep(self.step_seconds)
+            batch = list(self._requests.values())[:self.max_num_seqs]
+            self.steps += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            for state in batch:
+                try:
+                    finished = self._step(state)
+                except Exception as e:
+                    # Fail only this request; the loop keeps serving the rest of the batch
+                    logger.exception(f"Fake engine step failed for request {state['id']}")
+                    state["queue"].put_nowait(e)
+                    finished = True
+                if finished:
+                    self._requests.pop(state["id"], None)
+
+    def _step(self, state: Dict) -> bool:
+        """Produce one token for a running request; returns whether it finished"""
+        state["tokens"] += 1
+        state["text"] += f"tok{state['tokens']} "
+        finished = state["tokens"] >= state["params"].max_tokens
+        state["queue"].put_nowait(EngineOutput(
+            request_id=state["id"],
+            prompt_tokens=state["prompt_tokens"],
+            completions=[Completion(
+                index=index,
+                text=state["text"],
+                token_count=state["tokens"],
+                finish_reason="length" if finished else None
+            ) for index in range(state["params"].n)],
+            finished=finished
+        ))
+        return finished
+
+    async def generate(
+        self,
+        prompt: str,
+        params: GenerationParams,
+        request_id: str,
+        prompt_token_ids: Optional[List[int]] = None,
+        adapter: Optional[Adapter] = None
+    ) -> AsyncIterator[EngineOutput]:
+        if adapter is not None:
+            self.loaded_adapters[adapter.id] = adapter.name
+        queue: asyncio.Queue = asyncio.Queue()
+        self._requests[request_id] = {
+            "id": request_id,
+            "params": params,
+            "prompt_tokens": len(prompt_token_ids) if prompt_token_ids else len(prompt.split()),
+            "tokens": 0,
+            "text": "",
+            "queue": queue
+        }
+        self._wakeup.set()
+        while True:
+            output = await queue.get()
+            if isinstance(output, Exception):
+                raise output
+            yield output
+            if output.finished:
+                return
+
+    async def abort(self, request_id: str):
+        self._requests.pop(request_id, None)
+
+    async def remove_adapter(self, adapter: Adapter):
+        self.loaded_adapters.pop(adapter.id, None)
+
+
+class RequestScheduler:
+    """
+    Admission in front of the engine. Up to `max_concurrency` requests are
+    submitted to the engine at once, where they are batched together; up to
+    `max_queued` more wait (at most `queue_timeout` seconds) for a slot, and
+    anything beyond that is rejected with QueueFullError. Requests whose
+    consumer goes away are aborted in the engine so they stop using the GPU.
+
+    Unbounded requests (batch work) have their own admission: they may hold
+    at most `batch_share` of the slots, and freed slots always go to waiting
+    bounded (interactive) requests first, so a large batch cannot starve them.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        max_concurrency: int,
+        max_queued: int,
+        queue_timeout: float,
+        batch_share: float = 1.0
+    ):
+        self.engine = engine
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.max_running_unbounded = max(1, int(max_concurrency * batch_share))
+        # Futures of requests waiting for a slot, oldest first; a request's slot is
+        # counted as running before its future is resolved
+        self._bounded_waiters: deque = deque()
+        self._unbounded_waiters: deque = deque()
+        self.running = 0
+        self.running_unbounded = 0
+        self.waiting = 0
+        self.waiting_unbounded = 0
+        self.completed = 0
+        self.aborted = 0
+        self.rejected = 0
+
+    def _has_slot(self, bounded: bool) -> bool:
+        if self.running >= self.max_concurrency:
+            return False
+        return bounded or self.running_unbounded < self.max_running_unbounded
+
+    def _take_slot(self, bounded: bool):
+        self.running += 1
+        if not bounded:
+            self.running_unbounded += 1
+
+    def _queue(self, bounded: bool) -> deque:
+        return self._bounded_waiters if bounded else self._unbounded_waiters
+
+    async def _acquire(self, bounded: bool = True):
+        # A new request may not overtake queued ones it would be served after:
+        # bounded requests queue behind bounded ones, unbounded behind everyone
+        queued_ahead = self._bounded_waiters if bounded else (self._bounded_waiters or self._unbounded_waiters)
+        if not queued_ahead and self._has_slot(bounded):
+            self._take_slot(bounded)
+            return
+        # Batch work may queue without limit; only interactive requests are turned away
+        if bounded and self.waiting >= self.max_queued:
+            self.rejected += 1
+            raise QueueFullError("Request queue is full")
+        
+        slot_ready = asyncio.get_running_loop().create_future()
+        queue = self._queue(bounded)
+        queue.append(slot_ready)
+        counter = "waiting" if bounded else "waiting_unbounded"
+        setattr(self, counter, getattr(self, counter) + 1)
+        try:
+            await asyncio.wait_for(slot_ready, timeout=self.queue_timeout if bounded else None)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFullError("Timed out waiting for an engine slot")
+        except BaseException:
+            # _wake_waiters already counted this request as running; undo that
+            if slot_ready.done() and not slot_ready.cancelled():
+                self._release(bounded)
+            raise
+        finally:
+            setattr(self, counter, getattr(self, counter) - 1)
+            if slot_ready in queue:
+                queue.remove(slot_ready)
+
+    def _release(self, bounded: bool = True):
+        self.running -= 1
+        if not bounded:
+            self.running_unbounded -= 1
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        """Start queued requests while engine slots are free: all bounded ones before any unbounded one"""
+        if self._wake(self._bounded_waiters, bounded=True):
+            self._wake(self._unbounded_waiters, bounded=False)
+
+    def _wake(self, queue: deque, bounded: bool) -> bool:
+        """Start requests from the front of `queue`; returns whether it was drained"""
+        while queue:
+            slot_ready = queue[0]
+            if slot_ready.done():  # timed out or cancelled while queued
+                queue.popleft()
+                continue
+            if not self._has_slot(bounded):
+                return False
+            queue.popleft()
+            self._take_slot(bounded)
+            slot_ready.set_result(None)
+        return True
+
+    async def stream(
+        self,
+        prompt: str,
+        params: GenerationParams,
+        request_id: str,
+        prompt_token_ids: Optional[List[int]] = None,
+        bounded: bool = True,
+        adapter: Optional[Adapter] = None
+    ) -> AsyncIterator[EngineOutput]:
+        """Yield engine outputs as they arrive; aborts the request if closed early.
+
+        Unbounded requests (batch work) bypass the queue size and wait timeout,
+        and only get slots no bounded request is waiting for.
+        """
+        await self._acquire(bounded)
+        finished = False
+        try:
+            async for output in self.engine.generate(prompt, params, request_id, prompt_token_ids, adapter):
+                yield output
+                if output.finished:
+                    finished = True
+        finally:
+            self._release(bounded)
+            if finished:
+                self.completed += 1
+            else:
+                self.aborted += 1
+                # Shielded so the abort still reaches the engine when we are being cancelled
+                await asyncio.shield(self.engine.abort(request_id))
+
+    async def generate(
+        self,
+        prompt: str,
+        params: GenerationParams,
+        request_id: str,
+        prompt_token_ids: Optional[List[int]] = None,
+        bounded: bool = True,
+        adapter: Optional[Adapter] = None
+    ) -> EngineOutput:
+        """Run a request to completion and return its final output."""
+        final = None
+        async for output in self.stream(prompt, params, request_id, prompt_token_ids, bounded, adapter):
+            final = output
+        return final
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "running_unbounded": self.running_unbounded,
+            "waiting": self.waiting,
+            "waiting_unbounded": self.waiting_unbounded,
+            "max_concurrency": self.max_concurrency,
+            "max_running_unbounded": self.max_running_unbounded,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "aborted": self.aborted,
+            "rejected": self.rejected
+        }
+
+
+def create_engine(
+    backend: str,
+    engine_kwargs: Dict,
+    fake_step_seconds: float = 0.02,
+    fake_load_seconds: float = 0.0
+) -> Engine:
+    if backend == "vllm":
+        return VLLMEngine(engine_kwargs)
+    if backend == "fake":
+        logger.warning("Using the fake CPU engine; outputs are placeholder tokens")
+        return FakeEngine(
+            step_seconds=fake_step_seconds,
+            max_num_seqs=engine_kwargs.get("max_num_seqs", 256),
+            load_seconds=fake_load_seconds
+        )
+    raise ValueError(f"Unknown ENGINE_BACKEND: {backend}")
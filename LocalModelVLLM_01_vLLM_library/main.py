@@ -1,13 +1,22 @@
 import os
+import json
+import signal
 import asyncio
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+import time
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import AsyncIterator, List, Dict, Any, Optional
 import uvicorn
-from vllm import LLM, SamplingParams
 import logging
 
 import constants as c  # Import constants for model name and local directory
+from engine import EngineOutput, GenerationParams, QueueFullError, RequestScheduler, create_engine
+from model_index import INDEX_FILENAME, load_index, lookup_model, model_subdir
+from prompts import PromptBuilder
+from registry import ModelRegistry, UnknownModelError, discover_adapters
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +33,12 @@ class ChatCompletionRequest(BaseModel):
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 512
     top_p: Optional[float] = 0.9
+    stream: Optional[bool] = False
+    stream_options: Optional[Dict[str, Any]] = None
+    n: Optional[int] = 1  # completions returned per prompt
+    best_of: Optional[int] = None  # candidates sampled to pick the n best from
+    seed: Optional[int] = None
+    custom_id: Optional[str] = None  # echoed back in /v1/batch results
 
 class ChatCompletionResponse(BaseModel):
     id: str
@@ -33,70 +48,385 @@ class ChatCompletionResponse(BaseModel):
     choices: List[Dict[str, Any]]
     usage: Dict[str, int]
 
-# Initialize FastAPI app
-app = FastAPI(title=c.MODEL_NAME +" vLLM Server", version="1.0.0")
-
 # Global variables
-llm = None
+scheduler: Optional[RequestScheduler] = None
+prompt_builder: Optional[PromptBuilder] = None
+registry: Optional[ModelRegistry] = None
 model_name = c.MODEL_NAME  # Use the model name from constants
 
-def initialize_model():
-    """Initialize the vLLM model"""
-    global llm
-    
+def resolve_model_path() -> str:
+    """Local snapshot recorded in the model index, otherwise the HuggingFace model id"""
     model_path = os.environ.get('MODEL_PATH', '/app/models')
-    model_subdir = f"models--{model_name.replace('/', '--')}"
-    local_model_path = os.path.join(model_path, model_subdir)
+    index = load_index(model_path)
     
-    logger.info(f"Looking for model at: {local_model_path}")
-    
-    # Check if local model exists
-    if os.path.exists(local_model_path) and os.path.isdir(local_model_path):
-        logger.info("Loading model from local path...")
-        model_to_load = local_model_path
+    if index is None:
+        # Directory populated before the index existed: probe for the snapshot once
+        legacy_path = os.path.join(model_path, model_subdir(model_name))
+        if os.path.isdir(legacy_path):
+            logger.warning(f"No {INDEX_FILENAME} in {model_path}; using unindexed snapshot {legacy_path}")
+            return legacy_path
     else:
-        logger.info("Local model not found, will try to download from HuggingFace...")
-        model_to_load = model_name
+        local_model_path = lookup_model(model_path, model_name)
+        if local_model_path is not None:
+            entry = index["models"][model_name]
+            logger.info(f"Loading model from local path {local_model_path} (revision {entry.get('revision')})")
+            return local_model_path
+    logger.info("Local model not found, will try to download from HuggingFace...")
+    return model_name
 
-    logger.info(f"Resolved model path: {model_to_load}")
+class LoadState:
+    """Progress of the background model load, reported by the health endpoints"""
+    PHASES = ("pending", "resolving", "loading", "warming_up", "ready", "failed")
+    
+    def __init__(self):
+        self.phase = "pending"
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.phase_started_at = self.started_at
+        self.durations: Dict[str, float] = {}
+    
+    def enter(self, phase: str):
+        now = time.time()
+        self.durations[self.phase] = round(now - self.phase_started_at, 3)
+        self.phase = phase
+        self.phase_started_at = now
+        logger.info(f"Model load phase: {phase}")
+    
+    @property
+    def ready(self) -> bool:
+        return self.phase == "ready"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "phase": self.phase,
+            "ready": self.ready,
+            "error": self.error,
+            "elapsed": round(time.time() - self.started_at, 3),
+            "phase_durations": self.durations
+        }
+
+load_state = LoadState()
+
+async def warm_up():
+    """Run a small batch through the engine so kernels are compiled before readiness"""
+    if c.WARMUP_BATCH_SIZE <= 0:
+        return
+    request = ChatCompletionRequest(
+        model=model_name,
+        messages=[Message(role="user", content=c.WARMUP_PROMPT)],
+        max_tokens=c.WARMUP_MAX_TOKENS
+    )
+    prepared = prepare_generation(request)
+    await asyncio.gather(*[
+        run_generation(prepared, f"warmup-{i}", bounded=False)
+        for i in range(c.WARMUP_BATCH_SIZE)
+    ])
+
+async def initialize_model():
+    """Start the inference engine and the request queue in front of it, then warm up"""
+    global scheduler, prompt_builder, registry
     
     try:
-        # Initialize vLLM with the model
-        llm = LLM(
+        load_state.enter("resolving")
+        model_to_load = resolve_model_path()
+        logger.info(f"Resolved model path: {model_to_load}")
+        
+        adapters = discover_adapters(c.LORA_ADAPTERS, c.LORA_DIR)
+        engine_kwargs = dict(
             model=model_to_load,
             trust_remote_code=True,
-            max_model_len=2048,  # Adjust based on your needs
-            gpu_memory_utilization=0.8,
-            dtype="float16"  # Use float16 for better performance
+            # Unset values are left to vLLM's own defaults
+            **{key: value for key, value in c.ENGINE_CONFIG.items() if value is not None}
+        )
+        if adapters:
+            logger.info(f"LoRA adapters: {', '.join(sorted(adapters))}")
+            engine_kwargs.update(
+                enable_lora=True,
+                max_loras=min(c.LORA_MAX_PER_BATCH, c.LORA_MAX_RESIDENT),
+                max_lora_rank=c.LORA_MAX_RANK,
+                max_cpu_loras=c.LORA_MAX_RESIDENT
+            )
+        
+        load_state.enter("loading")
+        engine = create_engine(
+            c.ENGINE_BACKEND,
+            engine_kwargs,
+            fake_step_seconds=c.FAKE_ENGINE_STEP_SECONDS,
+            fake_load_seconds=c.FAKE_ENGINE_LOAD_SECONDS
+        )
+        await engine.start()
+        prompt_builder = PromptBuilder(
+            await engine.get_tokenizer(), format_messages_for_qwen, cache_size=c.PROMPT_CACHE_SIZE
+        )
+        scheduler = RequestScheduler(
+            engine,
+            max_concurrency=c.MAX_CONCURRENT_REQUESTS,
+            max_queued=c.MAX_QUEUED_REQUESTS,
+            queue_timeout=c.QUEUE_TIMEOUT,
+            batch_share=c.BATCH_MAX_CONCURRENCY_SHARE
+        )
+        registry = ModelRegistry(
+            engine, model_name, adapters, max_resident=c.LORA_MAX_RESIDENT, aliases=["default"]
         )
+        
+        load_state.enter("warming_up")
+        await warm_up()
+        
+        load_state.enter("ready")
         logger.info("Model loaded successfully!")
         return True
     except Exception as e:
+        load_state.error = str(e)
+        load_state.enter("failed")
         logger.error(f"Failed to load model: {str(e)}")
+        if c.EXIT_ON_LOAD_FAILURE:
+            # Let the container runtime restart us instead of serving 503s forever;
+            # the short delay lets uvicorn finish starting up so it shuts down cleanly
+            logger.error("Shutting down after failed model load")
+            await asyncio.sleep(1)
+            os.kill(os.getpid(), signal.SIGTERM)
         return False
 
-def format_messages_for_qwen(messages: List[Message]) -> str:
-    """Format messages for LLM model"""
+def require_ready():
+    """Fail fast with 503 + Retry-After until the model has loaded and warmed up"""
+    if load_state.ready:
+        return
+    if load_state.phase == "failed":
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {load_state.error}")
+    raise HTTPException(
+        status_code=503,
+        detail=f"Model is not ready (phase: {load_state.phase})",
+        headers={"Retry-After": str(c.STARTUP_RETRY_AFTER)}
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the model in the background so the port is up (and live) immediately"""
+    logger.info("Starting vLLM server...")
+    logger.info(f"Engine profile '{c.ENGINE_PROFILE}': {json.dumps(c.ENGINE_CONFIG)}")
+    load_task = asyncio.create_task(initialize_model())
+    yield
+    load_task.cancel()
+    if scheduler is not None:
+        await scheduler.engine.stop()
+
+# Initialize FastAPI app
+app = FastAPI(title=c.MODEL_NAME +" vLLM Server", version="1.0.0", lifespan=lifespan)
+
+def format_messages_for_qwen(messages: List[Dict[str, str]]) -> str:
+    """Plain-text prompt format, used when the tokenizer has no chat template"""
     formatted_prompt = ""
     
     for message in messages:
-        if message.role == "system":
-            formatted_prompt += f"System: {message.content}\n\n"
-        elif message.role == "user":
-            formatted_prompt += f"User: {message.content}\n\n"
-        elif message.role == "assistant":
-            formatted_prompt += f"Assistant: {message.content}\n\n"
+        if message["role"] == "system":
+            formatted_prompt += f"System: {message['content']}\n\n"
+        elif message["role"] == "user":
+            formatted_prompt += f"User: {message['content']}\n\n"
+        elif message["role"] == "assistant":
+            formatted_prompt += f"Assistant: {message['content']}\n\n"
     
     formatted_prompt += "Assistant: "
     return formatted_prompt
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize model on startup"""
-    logger.info("Starting vLLM server...")
-    success = initialize_model()
-    if not success:
-        logger.error("Failed to initialize model. Server may not work properly.")
+def sse_event(data: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+def prepare_generation(request: ChatCompletionRequest):
+    """Prompt text, prompt token ids, sampling parameters and LoRA adapter for a chat request"""
+    try:
+        adapter = registry.resolve(request.model)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    n = request.n or 1
+    if request.best_of is not None and request.best_of < n:
+        raise HTTPException(status_code=400, detail="best_of must be greater than or equal to n")
+    
+    # Render with the model's chat template and tokenize (cached)
+    prompt, prompt_token_ids = prompt_builder.build(
+        [{"role": m.role, "content": m.content} for m in request.messages]
+    )
+    
+    # Set up sampling parameters; the chat template ends turns with the EOS token,
+    # the plain-text format needs explicit stop strings
+    # Explicit nulls in the request fall back to the defaults
+    defaults = GenerationParams()
+    params = GenerationParams(
+        temperature=defaults.temperature if request.temperature is None else request.temperature,
+        top_p=defaults.top_p if request.top_p is None else request.top_p,
+        max_tokens=defaults.max_tokens if request.max_tokens is None else request.max_tokens,
+        stop=[] if prompt_builder.uses_chat_template else ["User:", "System:"],
+        n=n,
+        best_of=request.best_of,
+        seed=request.seed
+    )
+    return prompt, prompt_token_ids, params, adapter
+
+def stream_generation(prepared, request_id: str, bounded: bool = True) -> AsyncIterator[EngineOutput]:
+    """Engine outputs for a prepared request, dispatched to its model"""
+    prompt, prompt_token_ids, params, adapter = prepared
+    return registry.track(
+        adapter, scheduler.stream(prompt, params, request_id, prompt_token_ids, bounded, adapter)
+    )
+
+async def run_generation(prepared, request_id: str, bounded: bool = True) -> Optional[EngineOutput]:
+    """Run a prepared request to completion and return its final output"""
+    final = None
+    async for output in stream_generation(prepared, request_id, bounded):
+        final = output
+    return final
+
+def usage_from_output(output: EngineOutput) -> Dict[str, int]:
+    completion_tokens = sum(completion.token_count for completion in output.completions)
+    return {
+        "prompt_tokens": output.prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": output.prompt_tokens + completion_tokens
+    }
+
+def build_completion_response(request_id: str, model: str, output: Optional[EngineOutput]) -> ChatCompletionResponse:
+    if output is None or not output.completions:
+        raise HTTPException(status_code=500, detail="No output generated")
+    
+    return ChatCompletionResponse(
+        id=request_id,
+        created=int(time.time()),
+        model=model,
+        choices=[{
+            "index": completion.index,
+            "message": {
+                "role": "assistant",
+                "content": completion.text.strip()
+            },
+            "finish_reason": completion.finish_reason or "stop"
+        } for completion in output.completions],
+        usage=usage_from_output(output)
+    )
+
+async def stream_chat_chunks(
+    outputs: AsyncIterator[EngineOutput],
+    first: EngineOutput,
+    request_id: str,
+    model: str,
+    include_usage: bool
+) -> AsyncIterator[str]:
+    """Relay engine outputs as OpenAI chat.completion.chunk events.
+
+    vLLM reports the cumulative text on every step, so only the new suffix of
+    each choice is sent. If the client disconnects, the cancellation closes
+    `outputs`, which aborts the sequence in the engine and frees its slot.
+    """
+    created = int(time.time())
+    sent: Dict[int, int] = {}
+    finished = set()
+
+    def chunk(index: int, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "id": request_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": index, "delta": delta, "finish_reason": finish_reason}]
+        }
+
+    async def with_first() -> AsyncIterator[EngineOutput]:
+        yield first
+        async for output in outputs:
+            yield output
+
+    try:
+        async for output in with_first():
+            for completion in output.completions:
+                if completion.index not in sent:
+                    sent[completion.index] = 0
+                    yield sse_event(chunk(completion.index, {"role": "assistant", "content": ""}))
+                delta = completion.text[sent[completion.index]:]
+                sent[completion.index] = len(completion.text)
+                if delta:
+                    yield sse_event(chunk(completion.index, {"content": delta}))
+                if (completion.finish_reason or output.finished) and completion.index not in finished:
+                    finished.add(completion.index)
+                    yield sse_event(chunk(completion.index, {}, completion.finish_reason or "stop"))
+            if output.finished and include_usage:
+                yield sse_event({
+                    "id": request_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage_from_output(output)
+                })
+    except Exception as e:
+        logger.error(f"Error in chat completion stream: {str(e)}")
+        yield sse_event({"error": {"message": str(e), "type": "server_error"}})
+    finally:
+        await outputs.aclose()
+    yield "data: [DONE]\n\n"
+
+def parse_batch_items(raw: bytes, content_type: str) -> List[Any]:
+    """Batch body as a {"requests": [...]} object, a JSON array or JSONL (one request per line)"""
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items = []
+        for line_number, line in enumerate(raw.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                # The bad line still gets a result line with its index, carrying the parse error
+                items.append(ValueError(f"Invalid JSON on line {line_number}: {str(e)}"))
+        return items
+    
+    try:
+        body = json.loads(raw)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Batch body must be JSON or JSONL")
+    if isinstance(body, dict):
+        body = body.get("requests")
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Batch body must be a list of chat requests")
+    return body
+
+async def run_batch(items: List[Any], batch_id: str) -> AsyncIterator[str]:
+    """Submit every item to the engine at once and yield NDJSON lines as items finish"""
+    def result_line(index: int, item: Any, **fields) -> str:
+        custom_id = item.get("custom_id") if isinstance(item, dict) else None
+        return json.dumps({"index": index, "custom_id": custom_id, **fields}) + "\n"
+    
+    async def run_item(index: int, item: Any) -> str:
+        try:
+            if isinstance(item, Exception):
+                raise item
+            request = ChatCompletionRequest(**item)
+            prepared = prepare_generation(request)
+        except HTTPException as e:
+            return result_line(index, item, error={"status_code": e.status_code, "detail": e.detail})
+        except (ValidationError, ValueError, TypeError) as e:
+            return result_line(index, item, error={"status_code": 422, "detail": str(e)})
+        
+        request_id = f"{batch_id}-{index}"
+        try:
+            # Batch items wait for a slot instead of being rejected by the queue bound, behind chat requests
+            output = await run_generation(prepared, request_id, bounded=False)
+            response = build_completion_response(request_id, request.model, output)
+        except QueueFullError as e:
+            return result_line(index, item, error={"status_code": 503, "detail": str(e)})
+        except HTTPException as e:
+            return result_line(index, item, error={"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Error in batch item {request_id}: {str(e)}")
+            return result_line(index, item, error={"status_code": 500, "detail": str(e)})
+        return result_line(index, item, response=response.model_dump())
+    
+    # All items reach the engine together, so vLLM schedules them as one batch
+    tasks = [asyncio.create_task(run_item(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away: cancelling the items aborts them in the engine
+        for task in tasks:
+            task.cancel()
 
 @app.get("/")
 async def root():
@@ -106,63 +436,108 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "model_loaded": llm is not None}
+    return {"status": "healthy", "model_loaded": load_state.ready, "phase": load_state.phase}
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness: the process is up and serving HTTP, whatever the model is doing"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness: 200 once the model is loaded and warmed up, 503 before that"""
+    if not load_state.ready:
+        headers = {} if load_state.phase == "failed" else {"Retry-After": str(c.STARTUP_RETRY_AFTER)}
+        return JSONResponse(status_code=503, content=load_state.to_dict(), headers=headers)
+    return load_state.to_dict()
+
+@app.get("/config")
+async def config():
+    """Resolved engine and server configuration"""
+    return {
+        "model": model_name,
+        "engine_backend": c.ENGINE_BACKEND,
+        "engine_profile": c.ENGINE_PROFILE,
+        "engine_config_file": c.ENGINE_CONFIG_FILE or None,
+        "engine": c.ENGINE_CONFIG,
+        "server": {
+            "max_concurrent_requests": c.MAX_CONCURRENT_REQUESTS,
+            "max_queued_requests": c.MAX_QUEUED_REQUESTS,
+            "queue_timeout": c.QUEUE_TIMEOUT,
+            "batch_max_items": c.BATCH_MAX_ITEMS,
+            "prompt_cache_size": c.PROMPT_CACHE_SIZE,
+            "warmup_batch_size": c.WARMUP_BATCH_SIZE
+        }
+    }
+
+@app.get("/stats")
+async def stats():
+    """Request queue and engine occupancy"""
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    return {**scheduler.stats(), "prompt_cache": prompt_builder.stats(), "models": registry.stats()}
+
+@app.get("/v1/models")
+async def list_models():
+    """OpenAI-style model list: the base model and its LoRA adapters"""
+    if registry is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    return {"object": "list", "data": registry.list_models()}
 
 @app.post("/v1/chat/completions", response_model=ChatCompletionResponse)
 async def chat_completions(request: ChatCompletionRequest):
     """Chat completions endpoint compatible with OpenAI API"""
-    global llm
-    
-    if llm is None:
-        raise HTTPException(status_code=503, detail="Model not loaded")
+    require_ready()
     
     try:
-        # Format messages for the model
-        prompt = format_messages_for_qwen(request.messages)
-        
-        # Set up sampling parameters
-        sampling_params = SamplingParams(
-            temperature=request.temperature,
-            top_p=request.top_p,
-            max_tokens=request.max_tokens,
-            stop=["User:", "System:"]  # Stop generation at these tokens
-        )
+        prepared = prepare_generation(request)
         
-        # Generate response
-        outputs = llm.generate([prompt], sampling_params)
+        # Queued behind other requests, then batched with them by the engine
+        request_id = f"chatcmpl-{uuid.uuid4().hex}"
         
-        if not outputs or not outputs[0].outputs:
-            raise HTTPException(status_code=500, detail="No output generated")
+        if request.stream:
+            # Wait for admission and the first output here so a full queue is still a 503
+            outputs = stream_generation(prepared, request_id)
+            first = await outputs.__anext__()
+            include_usage = bool((request.stream_options or {}).get("include_usage"))
+            return StreamingResponse(
+                stream_chat_chunks(outputs, first, request_id, request.model, include_usage),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
         
-        generated_text = outputs[0].outputs[0].text.strip()
+        output = await run_generation(prepared, request_id)
+        return build_completion_response(request_id, request.model, output)
         
-        # Create response
-        import time
-        response = ChatCompletionResponse(
-            id=f"chatcmpl-{int(time.time())}",
-            created=int(time.time()),
-            model=request.model,
-            choices=[{
-                "index": 0,
-                "message": {
-                    "role": "assistant",
-                    "content": generated_text
-                },
-                "finish_reason": "stop"
-            }],
-            usage={
-                "prompt_tokens": len(prompt.split()),
-                "completion_tokens": len(generated_text.split()),
-                "total_tokens": len(prompt.split()) + len(generated_text.split())
-            }
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)}
         )
-        
-        return response
-        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat completion: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/v1/batch")
+async def batch_completions(request: Request):
+    """Run many chat requests in one engine batch; results stream back as NDJSON as they finish"""
+    require_ready()
+    
+    items = parse_batch_items(await request.body(), request.headers.get("Content-Type", "").lower())
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > c.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {c.BATCH_MAX_ITEMS} items")
+    
+    batch_id = f"batch-{uuid.uuid4().hex}"
+    logger.info(f"Received batch {batch_id} with {len(items)} items")
+    return StreamingResponse(
+        run_batch(items, batch_id),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-ID": batch_id}
+    )
+
 if __name__ == "__main__":
     logger.info("Starting " + c.MODEL_NAME +" vLLM Server...")
     uvicorn.run(app, host="0.0.0.0", port=9999, log_level="info")
\ No newline at end of file
@@ -0,0 +1,62 @@
+# model_index.py
+"""
+Index of models downloaded by download_model.py.
+
+The index is a JSON file (models_index.json) at the root of the model
+directory recording, per model id, the local subdirectory, the resolved
+revision, the total size and every file's size and checksum. The server
+resolves model paths from it instead of probing for directories.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+INDEX_FILENAME = "models_index.json"
+INDEX_VERSION = 1
+
+_lock = threading.Lock()
+
+
+def model_subdir(model_name: str) -> str:
+    """HuggingFace-style directory name for a model id"""
+    return f"models--{model_name.replace('/', '--')}"
+
+
+def index_path(model_dir: str) -> str:
+    return os.path.join(model_dir, INDEX_FILENAME)
+
+
+def load_index(model_dir: str) -> Optional[Dict]:
+    """The parsed index, or None if the directory has none"""
+    path = index_path(model_dir)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_model(model_dir: str, model_name: str, entry: Dict):
+    """Add or replace a model's entry; the file is rewritten atomically"""
+    with _lock:
+        index = load_index(model_dir) or {"version": INDEX_VERSION, "models": {}}
+        index["models"][model_name] = {**entry, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        path = index_path(model_dir)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def lookup_model(model_dir: str, model_name: str) -> Optional[str]:
+    """Absolute path of an indexed, present model, or None"""
+    index = load_index(model_dir)
+    if index is None:
+        return None
+    entry = index.get("models", {}).get(model_name)
+    if entry is None:
+        return None
+    path = os.path.join(model_dir, entry["path"])
+    return path if os.path.isdir(path) else None
@@ -0,0 +1,126 @@
+# prompts.py
+"""
+Prompt construction for the vLLM library server.
+
+Conversations are rendered with the tokenizer's own chat template and
+tokenized here, so the engine receives token ids directly. Rendered prompts,
+their token ids and the token ids of system prompts are kept in small LRU
+caches, since the same system prompt (and often the same whole prompt) is
+sent over and over.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class PromptBuilder:
+    """
+    Turns chat messages into (prompt_text, prompt_token_ids).
+
+    With no tokenizer, or a tokenizer without a chat template, `fallback`
+    formats the prompt and token ids are left to the engine (None).
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        fallback: Callable[[List[Dict[str, str]]], str],
+        cache_size: int = 1024
+    ):
+        self.tokenizer = tokenizer if getattr(tokenizer, "chat_template", None) else None
+        self.fallback = fallback
+        self._rendered = LRUCache(cache_size)
+        self._encoded = LRUCache(cache_size)
+        # system prompt -> (prefix text, prefix token ids, splits cleanly)
+        self._system = LRUCache(max(cache_size // 8, 16))
+        if tokenizer is not None and self.tokenizer is None:
+            logger.warning("Tokenizer has no chat template; using the plain-text prompt format")
+
+    @property
+    def uses_chat_template(self) -> bool:
+        return self.tokenizer is not None
+
+    def build(self, messages: List[Dict[str, str]]) -> Tuple[str, Optional[List[int]]]:
+        if self.tokenizer is None:
+            return self.fallback(messages), None
+
+        key = tuple((m["role"], m["content"]) for m in messages)
+        prompt = self._rendered.get(key)
+        if prompt is None:
+            prompt = self.tokenizer.apply_chat_template(
+                messages, tokenize=False, add_generation_prompt=True
+            )
+            self._rendered.put(key, prompt)
+
+        token_ids = self._encoded.get(prompt)
+        if token_ids is None:
+            token_ids = self._encode_with_system_prefix(prompt, messages)
+            self._encoded.put(prompt, token_ids)
+        return prompt, token_ids
+
+    def _encode(self, text: str) -> List[int]:
+        # The template already contains any special tokens the model expects
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def _encode_with_system_prefix(self, prompt: str, messages: List[Dict[str, str]]) -> List[int]:
+        """Reuse the cached token ids of a leading system prompt and only tokenize the rest."""
+        if not messages or messages[0]["role"] != "system":
+            return self._encode(prompt)
+
+        system = messages[0]["content"]
+        entry = self._system.get(system)
+        if entry is None:
+            prefix = self.tokenizer.apply_chat_template(
+                messages[:1], tokenize=False, add_generation_prompt=False
+            )
+            if not prompt.startswith(prefix):
+                self._system.put(system, (prefix, None, False))
+                return self._encode(prompt)
+            prefix_ids = self._encode(prefix)
+            full_ids = self._encode(prompt)
+            # Only split at the boundary if it doesn't change the tokenization
+            splits = full_ids[:len(prefix_ids)] == prefix_ids and \
+                full_ids[len(prefix_ids):] == self._encode(prompt[len(prefix):])
+            self._system.put(system, (prefix, prefix_ids, splits))
+            return full_ids
+
+        prefix, prefix_ids, splits = entry
+        if not splits or not prompt.startswith(prefix):
+            return self._encode(prompt)
+        return prefix_ids + self._encode(prompt[len(prefix):])
+
+    def stats(self) -> Dict:
+        return {
+            "chat_template": self.uses_chat_template,
+            "rendered": self._rendered.stats(),
+            "encoded": self._encoded.stats(),
+            "system_prompts": self._system.stats()
+        }
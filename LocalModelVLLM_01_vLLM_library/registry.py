@@ -0,0 +1,167 @@
+# registry.py
+"""
+Model registry for the vLLM library server.
+
+One base model is loaded in the engine; fine-tuned variants are served as
+LoRA adapters on top of it and selected per request by the `model` field.
+Adapters are loaded by the engine the first time a request uses them and the
+least recently used idle adapter is unloaded once more than `max_resident`
+are loaded.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+from engine import Adapter, Engine, EngineOutput
+
+logger = logging.getLogger(__name__)
+
+
+def discover_adapters(spec: str, directory: str) -> Dict[str, str]:
+    """Adapters from "name=path,..." plus every subdirectory of `directory` holding an adapter_config.json"""
+    adapters: Dict[str, str] = {}
+    if directory and os.path.isdir(directory):
+        for entry in sorted(os.listdir(directory)):
+            path = os.path.join(directory, entry)
+            if os.path.isfile(os.path.join(path, "adapter_config.json")):
+                adapters[entry] = path
+    for pair in spec.split(","):
+        if "=" in pair:
+            name, path = pair.split("=", 1)
+            adapters[name.strip()] = path.strip()
+    return adapters
+
+
+class UnknownModelError(Exception):
+    pass
+
+
+@dataclass
+class AdapterState:
+    adapter: Adapter
+    in_flight: int = 0
+    loads: int = 0
+    last_used: Optional[float] = None
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        engine: Engine,
+        base_model: str,
+        adapters: Dict[str, str],
+        max_resident: int,
+        aliases: Optional[List[str]] = None
+    ):
+        self.engine = engine
+        self.base_model = base_model
+        self.base_names = {base_model, *(aliases or [])}
+        self.max_resident = max(max_resident, 1)
+        self.created = int(time.time())
+        # vLLM identifies adapters by a positive integer id
+        self._adapters = {
+            name: AdapterState(Adapter(name=name, id=index, path=path))
+            for index, (name, path) in enumerate(sorted(adapters.items()), start=1)
+        }
+        self._resident: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    def resolve(self, model: Optional[str]) -> Optional[Adapter]:
+        """The adapter serving `model`, None for the base model"""
+        if not model or model in self.base_names:
+            return None
+        state = self._adapters.get(model)
+        if state is None:
+            raise UnknownModelError(
+                f"Model '{model}' not found; available: {', '.join(self.model_ids())}"
+            )
+        return state.adapter
+
+    def model_ids(self) -> List[str]:
+        return [self.base_model, *self._adapters]
+
+    async def _acquire(self, adapter: Adapter):
+        state = self._adapters[adapter.name]
+        state.in_flight += 1
+        state.last_used = time.time()
+        try:
+            async with self._lock:
+                if adapter.name not in self._resident:
+                    # The engine loads the adapter with the first request that names it
+                    state.loads += 1
+                    logger.info(f"Loading LoRA adapter '{adapter.name}' from {adapter.path}")
+                self._resident[adapter.name] = None
+                self._resident.move_to_end(adapter.name)
+                await self._evict()
+        except BaseException:
+            state.in_flight -= 1
+            raise
+
+    async def _evict(self):
+        while len(self._resident) > self.max_resident:
+            victim = next(
+                (name for name in self._resident if not self._adapters[name].in_flight), None
+            )
+            if victim is None:
+                return  # every resident adapter is busy; retry on the next acquire
+            del self._resident[victim]
+            logger.info(f"Unloading LoRA adapter '{victim}'")
+            try:
+                await self.engine.remove_adapter(self._adapters[victim].adapter)
+            except Exception as e:
+                logger.warning(f"Failed to unload LoRA adapter '{victim}': {str(e)}")
+
+    def _release(self, adapter: Adapter):
+        self._adapters[adapter.name].in_flight -= 1
+
+    async def track(
+        self, adapter: Optional[Adapter], outputs: AsyncIterator[EngineOutput]
+    ) -> AsyncIterator[EngineOutput]:
+        """Keep `adapter` resident (and out of eviction) while `outputs` is consumed"""
+        if adapter is not None:
+            await self._acquire(adapter)
+        try:
+            async for output in outputs:
+                yield output
+        finally:
+            if adapter is not None:
+                self._release(adapter)
+            # Closing the scheduler stream aborts the request if it did not finish
+            await outputs.aclose()
+
+    def list_models(self) -> List[Dict]:
+        models = [{
+            "id": self.base_model,
+            "object": "model",
+            "created": self.created,
+            "owned_by": "vllm",
+            "root": self.base_model,
+            "parent": None,
+            "loaded": True
+        }]
+        for name, state in self._adapters.items():
+            models.append({
+                "id": name,
+                "object": "model",
+                "created": self.created,
+                "owned_by": "vllm",
+                "root": state.adapter.path,
+                "parent": self.base_model,
+                "loaded": name in self._resident
+            })
+        return models
+
+    def stats(self) -> Dict:
+        return {
+            "max_resident": self.max_resident,
+            "resident": list(self._resident),
+            "adapters": {
+                name: {"in_flight": state.in_flight, "loads": state.loads, "last_used": state.last_used}
+                for name, state in self._adapters.items()
+            }
+        }
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import main
+from download_model import BandwidthLimiter, HubClient, download_model, fetch_file
+from model_index import load_index, model_subdir
+
+MODEL = "org/tiny-model"
+SHA = "0123456789abcdef0123456789abcdef01234567"
+FILES = {
+    "config.json": b'{"architectures": ["TinyModel"]}',
+    "model.safetensors": bytes(range(256)) * 64,
+}
+
+
+class FakeHub:
+    """Local stand-in for the HuggingFace Hub: model info with blobs, and file resolves with Range support"""
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.served = dict(files)  # what /resolve returns; tests may corrupt it
+        self.requests = []
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                hub.requests.append((self.path, self.headers.get("Range")))
+                if self.path.startswith(f"/api/models/{MODEL}/revision/"):
+                    self._send(200, json.dumps(hub.info()).encode(), "application/json")
+                    return
+                prefix = f"/{MODEL}/resolve/{SHA}/"
+                name = self.path[len(prefix):] if self.path.startswith(prefix) else None
+                if name not in hub.served:
+                    self._send(404, b"not found")
+                    return
+                data = hub.served[name]
+                byte_range = self.headers.get("Range")
+                if byte_range:
+                    start = int(byte_range.split("=")[1].rstrip("-"))
+                    if start >= len(data):
+                        self._send(416, b"")
+                        return
+                    self._send(206, data[start:], extra={"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"})
+                    return
+                self._send(200, data)
+
+            def _send(self, status, body, content_type="application/octet-stream", extra=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (extra or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def info(self):
+        siblings = []
+        for name, data in self.files.items():
+            if name.endswith(".safetensors"):
+                siblings.append({"rfilename": name, "lfs": {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}})
+            else:
+                blob_id = hashlib.sha1(f"blob {len(data)}\0".encode() + data).hexdigest()
+                siblings.append({"rfilename": name, "size": len(data), "blobId": blob_id})
+        return {"sha": SHA, "siblings": siblings}
+
+    def file_requests(self):
+        return [(path, byte_range) for path, byte_range in self.requests if "/resolve/" in path]
+
+
+@pytest.fixture
+def hub():
+    fake = FakeHub(FILES)
+    thread = threading.Thread(target=fake.server.serve_forever, daemon=True)
+    thread.start()
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+def expected_entry(hub, name):
+    return next(f for f in HubClient(hub.endpoint).model_info(MODEL, "main")["files"] if f["name"] == name)
+
+
+def test_fresh_download_writes_files_and_index(hub, tmp_path):
+    assert download_model(MODEL, str(tmp_path), client=HubClient(hub.endpoint))
+
+    target = tmp_path / model_subdir(MODEL)
+    for name, data in FILES.items():
+        assert (target / name).read_bytes() == data
+    entry = load_index(str(tmp_path))["models"][MODEL]
+    assert entry["path"] == model_subdir(MODEL)
+    assert entry["revision"] == SHA
+    assert entry["size"] == sum(len(data) for data in FILES.values())
+    assert set(entry["files"]) == set(FILES)
+
+
+def test_incomplete_file_is_resumed_with_a_range_request(hub, tmp_path):
+    name = "model.safetensors"
+    data = FILES[name]
+    partial = tmp_path / f"{name}.incomplete"
+    partial.write_bytes(data[:1000])
+
+    status = fetch_file(
+        HubClient(hub.endpoint), MODEL, SHA, str(tmp_path), expected_entry(hub, name), BandwidthLimiter(0)
+    )
+
+    assert status == "resumed"
+    assert (tmp_path / name).read_bytes() == data
+    assert not partial.exists()
+    assert hub.file_requests() == [(f"/{MODEL}/resolve/{SHA}/{name}", "bytes=1000-")]
+
+
+def test_checksum_mismatch_raises_and_removes_partial(hub, tmp_path):
+    name = "model.safetensors"
+    corrupted = bytearray(FILES[name])
+    corrupted[-1] ^= 0xFF
+    hub.served[name] = bytes(corrupted)
+
+    with pytest.raises(ValueError, match="mismatch"):
+        fetch_file(HubClient(hub.endpoint), MODEL, SHA, str(tmp_path), expected_entry(hub, name), BandwidthLimiter(0))
+
+    assert not (tmp_path / f"{name}.incomplete").exists()
+    assert not (tmp_path / name).exists()
+
+
+def test_second_run_skips_present_files(hub, tmp_path, caplog):
+    client = HubClient(hub.endpoint)
+    assert download_model(MODEL, str(tmp_path), client=client)
+    fetched = len(hub.file_requests())
+
+    # Indexed and unchanged: skipped without re-hashing
+    with caplog.at_level(logging.INFO):
+        assert download_model(MODEL, str(tmp_path), client=client)
+    assert f"{MODEL}: config.json cached" in caplog.text
+    assert f"{MODEL}: model.safetensors cached" in caplog.text
+
+    # Present but not in the index: re-hashed and kept
+    os.remove(tmp_path / "models_index.json")
+    caplog.clear()
+    with caplog.at_level(logging.INFO):
+        assert download_model(MODEL, str(tmp_path), client=client)
+    assert f"{MODEL}: config.json verified" in caplog.text
+    assert f"{MODEL}: model.safetensors verified" in caplog.text
+
+    assert len(hub.file_requests()) == fetched
+
+
+def test_resolve_model_path_uses_the_index(hub, tmp_path, monkeypatch):
+    assert download_model(MODEL, str(tmp_path), client=HubClient(hub.endpoint))
+    monkeypatch.setenv("MODEL_PATH", str(tmp_path))
+    monkeypatch.setattr(main, "model_name", MODEL)
+
+    assert main.resolve_model_path() == os.path.join(str(tmp_path), model_subdir(MODEL))
+
+    monkeypatch.setattr(main, "model_name", "org/not-downloaded")
+    assert main.resolve_model_path() == "org/not-downloaded"
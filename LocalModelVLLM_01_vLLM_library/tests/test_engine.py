@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from engine import Engine, FakeEngine, GenerationParams, QueueFullError, RequestScheduler
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def start_scheduler(**kwargs) -> RequestScheduler:
+    engine = FakeEngine(step_seconds=0.01)
+    await engine.start()
+    return RequestScheduler(engine, **kwargs)
+
+
+def test_large_batch_does_not_starve_interactive_requests():
+    async def scenario():
+        scheduler = await start_scheduler(max_concurrency=4, max_queued=8, queue_timeout=0.5, batch_share=0.5)
+        batch = [
+            asyncio.create_task(scheduler.generate(
+                "batch item", GenerationParams(max_tokens=5), f"batch-{i}", bounded=False
+            ))
+            for i in range(40)
+        ]
+        await asyncio.sleep(0.02)
+        assert scheduler.running_unbounded == 2
+        assert scheduler.waiting_unbounded == 38
+
+        output = await scheduler.generate("chat", GenerationParams(max_tokens=5), "chat-0")
+        assert output.finished
+        assert scheduler.waiting_unbounded > 0
+
+        await asyncio.gather(*batch)
+        await scheduler.engine.stop()
+        return scheduler.stats()
+
+    stats = run(scenario())
+    assert stats["completed"] == 41
+    assert stats["rejected"] == 0
+    assert stats["running"] == 0
+
+
+def test_freed_slots_go_to_interactive_waiters_first():
+    async def scenario():
+        scheduler = await start_scheduler(max_concurrency=2, max_queued=8, queue_timeout=5.0)
+        order = []
+
+        async def tracked(name: str, max_tokens: int, bounded: bool):
+            await scheduler.generate(name, GenerationParams(max_tokens=max_tokens), name, bounded=bounded)
+            order.append(name)
+
+        # Fill every slot with batch work, queue more batch work, then a chat request
+        tasks = [asyncio.create_task(tracked(f"batch-{i}", 3, False)) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(tracked("chat", 1, True)))
+        await asyncio.gather(*tasks)
+        await scheduler.engine.stop()
+        return order
+
+    order = run(scenario())
+    # The chat request took the first freed slot and finished before the queued batch items
+    assert order.index("chat") == 2
+
+
+def test_bounded_queue_still_rejects_when_full():
+    async def scenario():
+        scheduler = await start_scheduler(max_concurrency=1, max_queued=1, queue_timeout=5.0)
+        running = asyncio.create_task(scheduler.generate("a", GenerationParams(max_tokens=20), "a"))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(scheduler.generate("b", GenerationParams(max_tokens=1), "b"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.generate("c", GenerationParams(max_tokens=1), "c")
+        await asyncio.gather(running, queued)
+        await scheduler.engine.stop()
+
+    run(scenario())
+
+
+def test_engine_without_generate_fails_at_construction():
+    class Incomplete(Engine):
+        async def abort(self, request_id: str):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_failing_request_does_not_stop_the_fake_engine():
+    async def scenario():
+        scheduler = await start_scheduler(max_concurrency=4, max_queued=4, queue_timeout=5.0)
+        bad = GenerationParams(max_tokens=None)
+        results = await asyncio.gather(
+            scheduler.generate("bad", bad, "bad"),
+            scheduler.generate("good", GenerationParams(max_tokens=3), "good"),
+            return_exceptions=True
+        )
+        later = await asyncio.wait_for(scheduler.generate("later", GenerationParams(max_tokens=2), "later"), 5)
+        await scheduler.engine.stop()
+        return results, later
+
+    (bad, good), later = run(scenario())
+    assert isinstance(bad, TypeError)
+    assert good.finished and later.finished
@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+
+import constants as c
+import main
+
+
+async def start_fake_server(monkeypatch, tmp_path):
+    monkeypatch.setattr(c, "ENGINE_BACKEND", "fake")
+    monkeypatch.setattr(c, "FAKE_ENGINE_STEP_SECONDS", 0.001)
+    monkeypatch.setattr(c, "WARMUP_BATCH_SIZE", 1)
+    monkeypatch.setattr(c, "WARMUP_MAX_TOKENS", 2)
+    monkeypatch.setenv("MODEL_PATH", str(tmp_path))
+    assert await main.initialize_model()
+
+
+def test_null_sampling_fields_use_defaults(monkeypatch, tmp_path):
+    async def scenario():
+        await start_fake_server(monkeypatch, tmp_path)
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://server.test") as client:
+                request = {
+                    "model": main.model_name,
+                    "messages": [{"role": "user", "content": "hi"}],
+                    "max_tokens": None,
+                    "temperature": None,
+                    "top_p": None
+                }
+                first = await asyncio.wait_for(client.post("/v1/chat/completions", json=request), 10)
+                second = await asyncio.wait_for(
+                    client.post("/v1/chat/completions", json={**request, "max_tokens": 2}), 10
+                )
+        finally:
+            await main.scheduler.engine.stop()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.status_code == 200
+    assert first.json()["usage"]["completion_tokens"] == 512
+    assert second.status_code == 200
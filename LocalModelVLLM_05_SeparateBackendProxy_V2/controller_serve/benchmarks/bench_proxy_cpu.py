@@ -0,0 +1,67 @@
+# bench_proxy_cpu.py
+"""
+Controller CPU time per non-streaming request for 4 KB and 64 KB completion
+bodies. The stub backend runs in another process, so this process's CPU time
+is the client plus the controller; the client's share is measured on direct
+backend calls and subtracted.
+
+Also times the body handling alone: parsing and re-serializing the body with
+the stdlib json module (how the controller worked before raw pass-through)
+against the usage scan it does now.
+
+    python benchmarks/bench_proxy_cpu.py --requests 500 --sizes 4096 65536
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from harness import chat_payload, completion_body, import_controller, serve_controller, stub_backend
+
+
+async def cpu_per_request(client: httpx.AsyncClient, url: str, requests: int) -> float:
+    payload = chat_payload()
+    started = time.process_time()
+    for _ in range(requests):
+        response = await client.post(f"{url}/v1/chat/completions", json=payload)
+        response.raise_for_status()
+    return (time.process_time() - started) / requests
+
+
+def time_per_call(fn, calls: int = 2000) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - started) / calls
+
+
+async def run(args):
+    for size in args.sizes:
+        with stub_backend(content_bytes=size) as backend_url:
+            main = import_controller(backend_url)
+            # main is only imported once, configured with the first stub's URL
+            for backend in main.backend_pool.backends:
+                backend.url = backend_url
+            async with serve_controller(main) as controller_url:
+                async with httpx.AsyncClient(timeout=30) as client:
+                    await cpu_per_request(client, controller_url, 50)  # warm up
+                    direct = await cpu_per_request(client, backend_url, args.requests)
+                    proxied = await cpu_per_request(client, controller_url, args.requests)
+
+        body = completion_body(size)
+        reencode = time_per_call(lambda: json.dumps(json.loads(body)).encode())
+        scan = time_per_call(lambda: main.extract_usage(body))
+        print(
+            f"{len(body) / 1024:.0f} KB body: controller CPU {(proxied - direct) * 1e6:.0f} us/request | "
+            f"json parse+dump {reencode * 1e6:.1f} us vs usage scan {scan * 1e6:.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4096, 65536], help="completion content bytes")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,73 @@
+# bench_proxy_overhead.py
+"""
+p50/p99 latency the controller adds on top of the backend, with the shared
+pooled backend client ("pooled") and with a new client per backend call
+("per_request", how the controller worked before the shared client).
+
+    python benchmarks/bench_proxy_overhead.py --requests 1000 --backend-latency 0.005
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from harness import chat_payload, import_controller, percentile, serve_controller, stub_backend
+
+
+class ClientPerRequest:
+    """Opens a fresh AsyncClient (and so a new connection) for every backend call"""
+
+    async def post(self, url, **kwargs):
+        async with httpx.AsyncClient() as client:
+            return await client.post(url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        async with httpx.AsyncClient() as client:
+            return await client.get(url, **kwargs)
+
+    async def aclose(self):
+        pass
+
+
+async def measure(client: httpx.AsyncClient, url: str, requests: int) -> list:
+    payload = chat_payload()
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.post(f"{url}/v1/chat/completions", json=payload)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run(args):
+    with stub_backend(latency=args.backend_latency) as backend_url:
+        main = import_controller(backend_url)
+        async with serve_controller(main) as controller_url:
+            pooled_client = main.http_client
+            async with httpx.AsyncClient(timeout=30) as client:
+                await measure(client, backend_url, 50)  # warm up
+                direct = await measure(client, backend_url, args.requests)
+                results = {}
+                for mode in ("pooled", "per_request"):
+                    main.http_client = pooled_client if mode == "pooled" else ClientPerRequest()
+                    await measure(client, controller_url, 50)
+                    results[mode] = await measure(client, controller_url, args.requests)
+                main.http_client = pooled_client
+
+    print(f"{args.requests} sequential requests, backend latency {args.backend_latency * 1000:.1f} ms")
+    for q in (0.5, 0.99):
+        line = f"p{int(q * 100)}: direct {percentile(direct, q) * 1000:.2f} ms"
+        for mode, latencies in results.items():
+            overhead = percentile(latencies, q) - percentile(direct, q)
+            line += f" | {mode} {percentile(latencies, q) * 1000:.2f} ms (+{overhead * 1000:.2f} ms)"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--backend-latency", type=float, default=0.0, help="seconds the stub backend waits")
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,140 @@
+# harness.py
+"""
+Shared pieces for the controller benchmarks: a stub vLLM backend run in its
+own process (so its CPU is not counted against the controller) and the
+controller itself served by uvicorn in this process, both on localhost.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List
+
+import orjson
+
+CONTROLLER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def completion_body(content_bytes: int) -> bytes:
+    """An OpenAI chat.completion body whose message content is content_bytes long"""
+    return orjson.dumps({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "stub",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "x" * content_bytes},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 16, "completion_tokens": content_bytes // 4, "total_tokens": 16 + content_bytes // 4}
+    })
+
+
+def stub_app(latency: float, content_bytes: int):
+    """Raw ASGI stand-in for vLLM: /v1/models and non-streaming /v1/chat/completions"""
+    completion = completion_body(content_bytes)
+    models = orjson.dumps({"object": "list", "data": []})
+
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        while (await receive()).get("more_body"):
+            pass
+        body = completion if scope["path"] == "/v1/chat/completions" else models
+        if latency:
+            await asyncio.sleep(latency)
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+@contextmanager
+def stub_backend(latency: float = 0.0, content_bytes: int = 256):
+    """Run the stub backend in a subprocess and yield its base URL"""
+    port = free_port()
+    code = (
+        "import sys, uvicorn; sys.path.insert(0, sys.argv[1]); from harness import stub_app; "
+        "uvicorn.run(stub_app(float(sys.argv[3]), int(sys.argv[4])), "
+        "host='127.0.0.1', port=int(sys.argv[2]), log_level='warning')"
+    )
+    process = subprocess.Popen([
+        sys.executable, "-c", code, os.path.dirname(os.path.abspath(__file__)),
+        str(port), str(latency), str(content_bytes)
+    ])
+    try:
+        wait_for_port(port)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def import_controller(backend_url: str):
+    """Import main.py configured for benchmarking against backend_url"""
+    os.environ.update({
+        "LLM_API_HOSTS": backend_url,
+        "RATE_LIMIT_PER_MINUTE": str(10 ** 9),
+        "RESPONSE_CACHE_ENABLED": "false",
+        "HEALTH_CHECK_INTERVAL": "3600",
+        "HTTP2_ENABLED": "false",
+        "LOG_LEVEL": "WARNING"
+    })
+    sys.path.insert(0, CONTROLLER_DIR)
+    # main.py logs to logs/controller.log under the working directory; keep benchmark runs out of it
+    os.chdir(tempfile.mkdtemp(prefix="controller-bench-"))
+    import main
+    return main
+
+
+@asynccontextmanager
+async def serve_controller(main):
+    """Serve the controller app with uvicorn on localhost and yield its base URL"""
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+def chat_payload() -> Dict:
+    return {"messages": [{"role": "user", "content": "Hello, who are you?"}], "max_tokens": 64}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
@@ -1,8 +1,20 @@
 import os
-from typing import Optional
+from typing import List, Optional
 
 # Backend configuration
 LLM_BACKEND_URL: str = os.getenv("LLM_API_HOST", "http://vllm_openai_container:8000")
+# Multiple vLLM replicas: comma-separated URLs (falls back to LLM_API_HOST)
+LLM_BACKEND_URLS: List[str] = [
+    url.strip() for url in os.getenv("LLM_API_HOSTS", LLM_BACKEND_URL).split(",") if url.strip()
+]
+# Optional comma-separated routing weights, one per backend (default 1.0 each)
+LLM_BACKEND_WEIGHTS: List[float] = [
+    float(weight) for weight in os.getenv("LLM_API_WEIGHTS", "").split(",") if weight.strip()
+]
+# Routing strategy: least_requests, least_tokens or round_robin
+LOAD_BALANCER_STRATEGY: str = os.getenv("LOAD_BALANCER_STRATEGY", "least_requests")
+# Consecutive request failures before a backend's circuit breaker opens
+BACKEND_MAX_FAILURES: int = int(os.getenv("BACKEND_MAX_FAILURES", "3"))
 CONTROLLER_PORT: int = int(os.getenv("CONTROLLER_PORT", "9999"))
 CONTROLLER_HOST: str = os.getenv("CONTROLLER_HOST", "0.0.0.0")
 
@@ -10,12 +22,64 @@ CONTROLLER_HOST: str = os.getenv("CONTROLLER_HOST", "0.0.0.0")
 BACKEND_TIMEOUT: float = float(os.getenv("BACKEND_TIMEOUT", "60.0"))
 HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "10.0"))
 
+# Background health prober and circuit breaker
+HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "30.0"))
+HEALTH_CHECK_JITTER: float = float(os.getenv("HEALTH_CHECK_JITTER", "0.1"))  # +/- fraction of the delay
+HEALTH_CHECK_BACKOFF_BASE: float = float(os.getenv("HEALTH_CHECK_BACKOFF_BASE", "1.0"))  # first retry when down
+HEALTH_CHECK_BACKOFF_MAX: float = float(os.getenv("HEALTH_CHECK_BACKOFF_MAX", "60.0"))
+CIRCUIT_OPEN_SECONDS: float = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30.0"))  # open -> half-open
+CIRCUIT_HALF_OPEN_MAX_REQUESTS: int = int(os.getenv("CIRCUIT_HALF_OPEN_MAX_REQUESTS", "1"))
+
+# Admission control: per-backend concurrency cap and bounded priority queue
+BACKEND_MAX_IN_FLIGHT: int = int(os.getenv("BACKEND_MAX_IN_FLIGHT", "32"))
+ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "256"))
+PRIORITY_HEADER: str = os.getenv("PRIORITY_HEADER", "X-Priority")  # "interactive" (default) or "batch"
+INTERACTIVE_QUEUE_DEADLINE: float = float(os.getenv("INTERACTIVE_QUEUE_DEADLINE", "10.0"))
+BATCH_QUEUE_DEADLINE: float = float(os.getenv("BATCH_QUEUE_DEADLINE", "120.0"))
+# Fraction of each backend's slots batch traffic may occupy, keeping headroom for chat
+BATCH_MAX_IN_FLIGHT_SHARE: float = float(os.getenv("BATCH_MAX_IN_FLIGHT_SHARE", "0.75"))
+
+# /v1/batch: max items per batch and max concurrent backend calls per batch
+BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_MAX_PARALLELISM: int = int(os.getenv("BATCH_MAX_PARALLELISM", "16"))
+
+# Backend connection pool configuration (shared httpx.AsyncClient)
+HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30.0"))
+HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# Response cache for deterministic (temperature=0) chat completions
+RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "300.0"))
+# Optional on-disk tier (empty = memory only)
+RESPONSE_CACHE_DISK_DIR: str = os.getenv("RESPONSE_CACHE_DISK_DIR", "")
+# On-disk tier bounds: expired files are swept and the oldest removed past these limits
+RESPONSE_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_DISK_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
 # Logging configuration
 LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
 LOG_FORMAT: str = "%(asctime)s | %(levelname)s | %(name)s | %(funcName)s:%(lineno)d | %(message)s"
 
 # Rate limiting (requests per minute)
 RATE_LIMIT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_PER_MINUTE", "100"))
+# Token bucket size (max burst); defaults to one minute's worth of requests
+RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", str(RATE_LIMIT_PER_MINUTE)))
+# Limit per client "ip", or per "api_key" (X-API-Key / Bearer token, falling back to IP)
+RATE_LIMIT_KEY_BY: str = os.getenv("RATE_LIMIT_KEY_BY", "ip")
+# With RATE_LIMIT_KEY_BY=api_key: comma-separated API keys that get their own bucket;
+# requests with any other key (or none) are limited by IP, so made-up keys buy nothing
+RATE_LIMIT_API_KEYS: List[str] = [
+    key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()
+]
+# Storage backend: "memory" (per process) or "redis" (shared across controllers)
+RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+# In-memory store: idle seconds before a client's bucket is evicted, and hard cap on tracked clients
+RATE_LIMIT_IDLE_TTL: float = float(os.getenv("RATE_LIMIT_IDLE_TTL", "120.0"))
+RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
 
 # API configuration
 API_VERSION: str = "v1"
@@ -1,17 +1,31 @@
 from fastapi import FastAPI, Request, Body, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import httpx
-from pydantic import BaseModel, Field, validator
-from typing import List, Literal, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError, validator
+from typing import List, Literal, Optional, Dict, Any, Awaitable, Callable, Tuple
 import constants as c
 import logging
 import os
 import time
 import asyncio
+import hashlib
+import orjson
+import math
+import random
 from contextlib import asynccontextmanager
-from collections import defaultdict
-from datetime import datetime, timedelta
+from contextvars import ContextVar
+from collections import OrderedDict, deque
+from datetime import datetime
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, generate_latest, disable_created_metrics, CONTENT_TYPE_LATEST
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Only needed when RATE_LIMIT_BACKEND=redis
+    redis_asyncio = None
 
 # Ensure logs directory exists
 os.makedirs("logs", exist_ok=True)
@@ -27,10 +41,402 @@ logging.basicConfig(
 )
 logger = logging.getLogger("local_llm_api_controller")
 
-# Global variables for health checking and rate limiting
-backend_healthy = True
-last_health_check = 0
-rate_limit_store = defaultdict(list)
+# Prometheus metrics (dedicated registry, exposed on /metrics)
+disable_created_metrics()
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+OVERHEAD_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+metrics_registry = CollectorRegistry()
+REQUEST_LATENCY = Histogram(
+    "llm_controller_request_duration_seconds", "End-to-end request latency",
+    ["route", "method", "status"], buckets=LATENCY_BUCKETS, registry=metrics_registry
+)
+BACKEND_LATENCY = Histogram(
+    "llm_controller_backend_duration_seconds", "Time spent waiting on a vLLM backend",
+    ["backend", "outcome"], buckets=LATENCY_BUCKETS, registry=metrics_registry
+)
+PROXY_OVERHEAD = Histogram(
+    "llm_controller_proxy_overhead_seconds", "Request latency not spent waiting on the backend",
+    ["route"], buckets=OVERHEAD_BUCKETS, registry=metrics_registry
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "llm_controller_time_to_first_token_seconds", "Time from backend request to first streamed chunk",
+    ["backend"], buckets=LATENCY_BUCKETS, registry=metrics_registry
+)
+TOKENS_PER_SECOND = Histogram(
+    "llm_controller_completion_tokens_per_second", "Completion tokens per second of backend time",
+    buckets=(1, 5, 10, 25, 50, 100, 200, 400, 800, 1600), registry=metrics_registry
+)
+TOKENS_TOTAL = Counter(
+    "llm_controller_tokens", "Tokens reported in backend usage blocks",
+    ["type"], registry=metrics_registry
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "llm_controller_requests_in_flight", "Requests currently being handled", registry=metrics_registry
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "llm_controller_rate_limit_rejections", "Requests rejected by the rate limiter", registry=metrics_registry
+)
+ADMISSION_REJECTIONS = Counter(
+    "llm_controller_admission_rejections", "Requests rejected by admission control",
+    ["priority", "reason"], registry=metrics_registry
+)
+QUEUE_WAIT = Histogram(
+    "llm_controller_queue_wait_seconds", "Time spent queued for a backend slot",
+    ["priority"], buckets=LATENCY_BUCKETS, registry=metrics_registry
+)
+
+# Backend seconds spent by the current request, used to split out proxy overhead
+request_timing: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timing", default=None)
+
+def record_backend_time(backend_url: str, elapsed: float, outcome: str):
+    BACKEND_LATENCY.labels(backend_url, outcome).observe(elapsed)
+    timing = request_timing.get()
+    if timing is not None:
+        timing["backend"] += elapsed
+
+def record_usage(usage: Dict[str, Any], backend_seconds: float):
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    TOKENS_TOTAL.labels("prompt").inc(prompt_tokens)
+    TOKENS_TOTAL.labels("completion").inc(completion_tokens)
+    if completion_tokens and backend_seconds > 0:
+        TOKENS_PER_SECOND.observe(completion_tokens / backend_seconds)
+
+USAGE_SCAN_BYTES = 1024
+
+def extract_usage(body: bytes) -> Dict[str, Any]:
+    """Read the usage block from the tail of a completion body without parsing the whole body"""
+    start = max(0, len(body) - USAGE_SCAN_BYTES)
+    key = body.rfind(b'"usage"', start)
+    if key == -1 or (key > 0 and body[key - 1:key] == b"\\"):
+        return {}
+    brace = body.find(b"{", key)
+    if brace == -1:
+        return {}
+    depth = 0
+    for end in range(brace, len(body)):
+        char = body[end]
+        if char == 0x7B:  # {
+            depth += 1
+        elif char == 0x7D:  # }
+            depth -= 1
+            if depth == 0:
+                try:
+                    usage = orjson.loads(body[brace:end + 1])
+                except orjson.JSONDecodeError:
+                    return {}
+                return usage if isinstance(usage, dict) else {}
+    return {}
+
+class PrometheusMiddleware:
+    """Pure ASGI middleware: per-route latency, status and in-flight tracking with minimal overhead"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        timing = {"backend": 0.0}
+        token = request_timing.set(timing)
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_FLIGHT.dec()
+            request_timing.reset(token)
+            # FastAPI stores the matched route in the scope; use its template to bound label cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(route, scope["method"], str(status_code)).observe(elapsed)
+            if timing["backend"]:
+                PROXY_OVERHEAD.labels(route).observe(max(0.0, elapsed - timing["backend"]))
+
+# Background health probe tasks (started and cancelled in lifespan)
+health_probe_tasks: List[asyncio.Task] = []
+
+# Shared backend HTTP client (created and closed in lifespan)
+http_client: Optional[httpx.AsyncClient] = None
+
+# Load balancing across vLLM replicas
+LOAD_BALANCER_STRATEGIES = ("least_requests", "least_tokens", "round_robin")
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+class Backend:
+    """A single vLLM replica, its routing state and its circuit breaker"""
+
+    def __init__(self, url: str, weight: float = 1.0):
+        if weight <= 0:
+            raise ValueError(f"Backend weight must be positive, got {weight} for {url}")
+        self.url = url.rstrip("/")
+        self.weight = weight
+        self.circuit = CIRCUIT_CLOSED
+        self.opened_at = 0.0
+        self.last_probe = 0.0
+        self.probe_failures = 0
+        self.in_flight = 0
+        self.in_flight_tokens = 0
+        self.consecutive_failures = 0
+        self.total_requests = 0
+        self.total_failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.circuit != CIRCUIT_OPEN
+
+    def is_available(self, now: float) -> bool:
+        """Whether the breaker lets a new request through; reads state only, never does I/O"""
+        if self.circuit == CIRCUIT_OPEN and now - self.opened_at >= c.CIRCUIT_OPEN_SECONDS:
+            self._transition(CIRCUIT_HALF_OPEN)
+        if self.circuit == CIRCUIT_HALF_OPEN:
+            # Only a few trial requests while the backend proves itself
+            return self.in_flight < c.CIRCUIT_HALF_OPEN_MAX_REQUESTS
+        return self.circuit == CIRCUIT_CLOSED
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.circuit == CIRCUIT_HALF_OPEN:
+            self._transition(CIRCUIT_CLOSED)
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        if self.circuit == CIRCUIT_HALF_OPEN or self.consecutive_failures >= c.BACKEND_MAX_FAILURES:
+            self.trip()
+
+    def record_probe(self, healthy: bool):
+        self.last_probe = time.time()
+        if not healthy:
+            self.probe_failures += 1
+            self.trip()
+            return
+        self.probe_failures = 0
+        if self.circuit == CIRCUIT_OPEN:
+            self._transition(CIRCUIT_HALF_OPEN)
+        elif self.circuit == CIRCUIT_HALF_OPEN:
+            self.record_success()
+
+    def trip(self):
+        # Re-arm the open timer even if already open, so failing probes keep it open
+        self.opened_at = time.monotonic()
+        if self.circuit != CIRCUIT_OPEN:
+            self._transition(CIRCUIT_OPEN)
+
+    def _transition(self, state: str):
+        logger.info(f"Backend {self.url} circuit {self.circuit} -> {state}")
+        self.circuit = state
+
+    def load(self, strategy: str) -> float:
+        outstanding = self.in_flight_tokens if strategy == "least_tokens" else self.in_flight
+        return (outstanding + 1) / self.weight
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "circuit": self.circuit,
+            "last_probe": self.last_probe,
+            "in_flight": self.in_flight,
+            "in_flight_tokens": self.in_flight_tokens,
+            "consecutive_failures": self.consecutive_failures,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures
+        }
+
+class BackendPool:
+    """Routes requests to the healthy replica with the lowest weighted outstanding load"""
+
+    def __init__(self, urls: List[str], weights: List[float], strategy: str):
+        if not urls:
+            raise ValueError("At least one backend URL is required")
+        if strategy not in LOAD_BALANCER_STRATEGIES:
+            raise ValueError(f"Unknown load balancer strategy: {strategy}")
+        if weights and len(weights) != len(urls):
+            raise ValueError(f"Got {len(weights)} backend weights for {len(urls)} backends")
+        weights = weights or [1.0] * len(urls)
+        self.backends = [Backend(url, weight) for url, weight in zip(urls, weights)]
+        self.strategy = strategy
+        self._rr_index = 0
+
+    def available_backends(self) -> List[Backend]:
+        now = time.monotonic()
+        return [backend for backend in self.backends if backend.is_available(now)]
+
+    def any_healthy(self) -> bool:
+        return any(backend.healthy for backend in self.backends)
+
+    def last_probe(self) -> float:
+        return max(backend.last_probe for backend in self.backends)
+
+    def acquire(self, tokens: int = 0, max_in_flight: Optional[int] = None) -> Optional[Backend]:
+        """Pick a backend and count the request as in flight; None if none can take it"""
+        candidates = self.available_backends()
+        if max_in_flight is not None:
+            candidates = [backend for backend in candidates if backend.in_flight < max_in_flight]
+        if not candidates:
+            return None
+        if self.strategy == "round_robin":
+            backend = candidates[self._rr_index % len(candidates)]
+            self._rr_index += 1
+        else:
+            backend = min(candidates, key=lambda b: (b.load(self.strategy), b.total_requests))
+        backend.in_flight += 1
+        backend.in_flight_tokens += tokens
+        backend.total_requests += 1
+        return backend
+
+    def release(self, backend: Backend, tokens: int = 0, failed: bool = False):
+        backend.in_flight -= 1
+        backend.in_flight_tokens -= tokens
+        if failed:
+            backend.record_failure()
+        else:
+            backend.record_success()
+
+backend_pool = BackendPool(c.LLM_BACKEND_URLS, c.LLM_BACKEND_WEIGHTS, c.LOAD_BALANCER_STRATEGY)
+
+# Admission control in front of the backend pool
+PRIORITY_CLASSES = ("interactive", "batch")  # highest priority first
+
+class AdmissionController:
+    """Caps in-flight requests per backend and queues the overflow by priority class with deadlines"""
+
+    def __init__(self, pool: BackendPool, queue_size: int):
+        self.pool = pool
+        self.queue_size = queue_size
+        self.deadlines = {"interactive": c.INTERACTIVE_QUEUE_DEADLINE, "batch": c.BATCH_QUEUE_DEADLINE}
+        self.max_in_flight = {
+            "interactive": c.BACKEND_MAX_IN_FLIGHT,
+            "batch": max(1, int(c.BACKEND_MAX_IN_FLIGHT * c.BATCH_MAX_IN_FLIGHT_SHARE))
+        }
+        # priority -> FIFO of (waiter, tokens); waiters are resolved with an acquired Backend
+        self._waiters: Dict[str, deque] = {priority: deque() for priority in PRIORITY_CLASSES}
+        # Moving average of how long a request holds a backend slot
+        self.avg_service_time = 1.0
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        if priority is not None:
+            return len(self._waiters[priority])
+        return sum(len(queue) for queue in self._waiters.values())
+
+    def expected_wait(self, priority: str) -> float:
+        capacity = sum(
+            self.max_in_flight[priority] for _ in self.pool.available_backends()
+        )
+        if capacity == 0:
+            return math.inf
+        ahead = 0
+        for cls in PRIORITY_CLASSES:
+            ahead += self.queued(cls)
+            if cls == priority:
+                break
+        return (ahead + 1) * self.avg_service_time / capacity
+
+    def _reject(self, priority: str, reason: str, detail: str, retry_after: float):
+        ADMISSION_REJECTIONS.labels(priority, reason).inc()
+        if math.isinf(retry_after):
+            retry_after = c.CIRCUIT_OPEN_SECONDS
+        raise HTTPException(
+            status_code=503,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    async def acquire(self, priority: str, tokens: int, request_id: str) -> Backend:
+        # Only take a free slot directly if nobody of equal or higher priority is waiting for one
+        if not any(self._waiters[cls] for cls in PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority) + 1]):
+            backend = self.pool.acquire(tokens, self.max_in_flight[priority])
+            if backend is not None:
+                QUEUE_WAIT.labels(priority).observe(0.0)
+                return backend
+        
+        if not self.pool.available_backends():
+            logger.warning(f"Backend is unhealthy, rejecting request. Request ID: {request_id}")
+            self._reject(priority, "unavailable", "Backend service unavailable", c.CIRCUIT_OPEN_SECONDS)
+        deadline = self.deadlines[priority]
+        expected_wait = self.expected_wait(priority)
+        if self.queued() >= self.queue_size:
+            logger.warning(f"Admission queue full, rejecting {priority} request. Request ID: {request_id}")
+            self._reject(priority, "queue_full", "Request queue is full", expected_wait)
+        if expected_wait > deadline:
+            logger.warning(
+                f"Expected wait {expected_wait:.1f}s exceeds {priority} deadline {deadline:.1f}s. Request ID: {request_id}"
+            )
+            self._reject(priority, "deadline", "Server overloaded, expected wait exceeds deadline", expected_wait)
+        
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, tokens)
+        self._waiters[priority].append(entry)
+        started = time.perf_counter()
+        try:
+            backend = await asyncio.wait_for(waiter, timeout=deadline)
+        except asyncio.TimeoutError:
+            self._reject(priority, "timeout", "Timed out waiting for a backend slot", self.expected_wait(priority))
+        except BaseException:
+            # Cancelled (e.g. client disconnect) right after being handed a slot: give it back
+            if waiter.done() and not waiter.cancelled():
+                self.release(waiter.result(), tokens)
+            raise
+        finally:
+            if entry in self._waiters[priority]:
+                self._waiters[priority].remove(entry)
+        QUEUE_WAIT.labels(priority).observe(time.perf_counter() - started)
+        return backend
+
+    def release(self, backend: Backend, tokens: int = 0, failed: bool = False, held: Optional[float] = None):
+        self.pool.release(backend, tokens, failed=failed)
+        if held is not None:
+            self.avg_service_time = 0.9 * self.avg_service_time + 0.1 * held
+        self.dispatch()
+
+    def dispatch(self):
+        """Hand freed slots to waiters, strictly by priority class and FIFO within a class"""
+        for priority in PRIORITY_CLASSES:
+            queue = self._waiters[priority]
+            while queue:
+                waiter, tokens = queue[0]
+                if waiter.done():
+                    queue.popleft()
+                    continue
+                backend = self.pool.acquire(tokens, self.max_in_flight[priority])
+                if backend is None:
+                    # Lower classes have tighter slot limits, so they cannot be served either
+                    return
+                queue.popleft()
+                waiter.set_result(backend)
+
+admission_controller = AdmissionController(backend_pool, c.ADMISSION_QUEUE_SIZE)
+
+def request_priority(request: Request, default: str = "interactive") -> str:
+    priority = request.headers.get(c.PRIORITY_HEADER, default).strip().lower()
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {c.PRIORITY_HEADER} header, expected one of: {', '.join(PRIORITY_CLASSES)}"
+        )
+    return priority
+
+def is_backend_failure(exc: Exception) -> bool:
+    """Client errors (4xx) from the backend do not count against its health"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.HTTPError)
 
 # Enhanced Pydantic models
 class Message(BaseModel):
@@ -89,67 +495,549 @@ class ErrorResponse(BaseModel):
     timestamp: str
     request_id: Optional[str] = None
 
-# Rate limiting dependency
-async def rate_limit_check(request: Request):
-    client_ip = request.client.host
-    current_time = datetime.now()
-    
-    # Clean old requests
-    rate_limit_store[client_ip] = [
-        req_time for req_time in rate_limit_store[client_ip]
-        if current_time - req_time < timedelta(minutes=1)
-    ]
+# Shared HTTP client helpers
+def create_http_client() -> httpx.AsyncClient:
+    """Create the long-lived, keep-alive pooled client used for all backend calls"""
+    limits = httpx.Limits(
+        max_connections=c.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=c.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=c.HTTP_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=c.BACKEND_TIMEOUT,
+        http2=c.HTTP2_ENABLED
+    )
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Report usage of the shared connection pool"""
+    stats = {
+        "max_connections": c.HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": c.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "http2": c.HTTP2_ENABLED,
+        "total_connections": 0,
+        "active_connections": 0,
+        "idle_connections": 0
+    }
+    # httpx does not expose pool usage publicly; read it from the httpcore pool
+    pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return stats
+    idle = sum(1 for conn in connections if conn.is_idle())
+    stats["total_connections"] = len(connections)
+    stats["idle_connections"] = idle
+    stats["active_connections"] = len(connections) - idle
+    return stats
+
+# Rate limiting
+class InMemoryRateLimitStore:
+    """Per-key token buckets kept in LRU order so idle keys are evicted in O(1)"""
+
+    def __init__(self, rate_per_minute: int, burst: int, idle_ttl: float, max_keys: int):
+        self.refill_rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.idle_ttl = idle_ttl
+        self.max_keys = max_keys
+        # key -> [tokens, last_seen]; least recently seen first
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def hit(self, key: str, cost: int = 1) -> float:
+        """Consume `cost` tokens; returns 0 if allowed, otherwise seconds until retry"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[key] = bucket
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_rate)
+            bucket[1] = now
+        self._evict_idle(now)
+        
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) / self.refill_rate
+
+    def _evict_idle(self, now: float):
+        # An evicted bucket would have refilled anyway once idle_ttl covers a full refill
+        while self._buckets:
+            _, (_, last_seen) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_keys and now - last_seen < self.idle_ttl:
+                break
+            self._buckets.popitem(last=False)
+
+    def active_keys(self) -> Optional[int]:
+        return len(self._buckets)
+
+    async def close(self):
+        self._buckets.clear()
+
+class RedisRateLimitStore:
+    """Sliding-window counter shared across controllers via any redis.asyncio-compatible client"""
+
+    def __init__(self, client: Any, rate_per_minute: int, window: float = 60.0, prefix: str = "ratelimit"):
+        self.client = client
+        self.limit = rate_per_minute
+        self.window = window
+        self.prefix = prefix
+
+    async def hit(self, key: str, cost: int = 1) -> float:
+        """Count `cost` requests; returns 0 if allowed, otherwise seconds until retry"""
+        now = time.time()
+        window_index = int(now // self.window)
+        elapsed = now - window_index * self.window
+        current_key = f"{self.prefix}:{key}:{window_index}"
+        previous_key = f"{self.prefix}:{key}:{window_index - 1}"
+        
+        # Keys expire on their own, so idle clients cost nothing
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incr(current_key, cost)
+        pipe.expire(current_key, int(self.window * 2))
+        pipe.get(previous_key)
+        current, _, previous = await pipe.execute()
+        
+        # Weight the previous window by how much of it still overlaps the sliding window
+        estimated = int(previous or 0) * (1.0 - elapsed / self.window) + int(current)
+        if estimated <= self.limit:
+            return 0.0
+        await self.client.decr(current_key, cost)
+        return self.window - elapsed
+
+    def active_keys(self) -> Optional[int]:
+        # Tracked by Redis key expiry, not counted here
+        return None
+
+    async def close(self):
+        close = getattr(self.client, "aclose", None) or self.client.close
+        await close()
+
+def create_rate_limiter():
+    if c.RATE_LIMIT_BACKEND == "redis":
+        if redis_asyncio is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        client = redis_asyncio.from_url(c.RATE_LIMIT_REDIS_URL)
+        return RedisRateLimitStore(client, c.RATE_LIMIT_PER_MINUTE)
+    if c.RATE_LIMIT_BACKEND != "memory":
+        raise ValueError(f"Unknown rate limit backend: {c.RATE_LIMIT_BACKEND}")
+    return InMemoryRateLimitStore(
+        c.RATE_LIMIT_PER_MINUTE,
+        c.RATE_LIMIT_BURST,
+        c.RATE_LIMIT_IDLE_TTL,
+        c.RATE_LIMIT_MAX_KEYS
+    )
+
+rate_limiter = create_rate_limiter()
+
+def hash_api_key(api_key: str) -> str:
+    # Never keep raw credentials in the limiter store
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+# Keys are not authenticated here, so only configured ones get a bucket of their own;
+# otherwise a client could rotate random keys for unlimited requests and evict real buckets
+rate_limit_api_keys = {hash_api_key(key) for key in c.RATE_LIMIT_API_KEYS}
+if c.RATE_LIMIT_KEY_BY == "api_key" and not rate_limit_api_keys:
+    logger.warning("RATE_LIMIT_KEY_BY=api_key without RATE_LIMIT_API_KEYS: every request is limited by IP")
+
+def rate_limit_key(request: Request) -> str:
+    if c.RATE_LIMIT_KEY_BY == "api_key":
+        api_key = request.headers.get("X-API-Key")
+        authorization = request.headers.get("Authorization", "")
+        if not api_key and authorization.lower().startswith("bearer "):
+            api_key = authorization[7:].strip()
+        if api_key:
+            key_hash = hash_api_key(api_key)
+            if key_hash in rate_limit_api_keys:
+                return "key:" + key_hash
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+async def charge_rate_limit(
+    request: Request,
+    cost: int = 1,
+    detail: str = "Rate limit exceeded. Please try again later."
+):
+    """Take `cost` requests from the caller's budget, raising 429 if it doesn't cover them"""
+    try:
+        retry_after = await rate_limiter.hit(rate_limit_key(request), cost)
+    except Exception as e:
+        # Fail open: a broken limiter store must not take the API down
+        logger.warning(f"Rate limiter unavailable, allowing request: {str(e)}")
+        return
     
-    # Check rate limit
-    if len(rate_limit_store[client_ip]) >= c.RATE_LIMIT_PER_MINUTE:
+    if retry_after > 0:
+        RATE_LIMIT_REJECTIONS.inc()
         raise HTTPException(
             status_code=429,
-            detail="Rate limit exceeded. Please try again later."
+            detail=detail,
+            headers={"Retry-After": str(math.ceil(retry_after))}
         )
-    
-    # Record current request
-    rate_limit_store[client_ip].append(current_time)
 
-# Health check for backend
-async def check_backend_health():
-    global backend_healthy, last_health_check
-    current_time = time.time()
-    
-    # Check every 30 seconds
-    if current_time - last_health_check < 30:
-        return backend_healthy
-    
+# Rate limiting dependency
+async def rate_limit_check(request: Request):
+    await charge_rate_limit(request)
+
+# Response cache for deterministic completions
+class ResponseCache:
+    """LRU + TTL cache with an optional on-disk tier; concurrent identical misses share one fetch"""
+
+    DISK_SWEEP_EVERY = 100  # disk writes between sweeps of the on-disk tier
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        disk_dir: str = "",
+        disk_max_entries: int = 10000,
+        disk_max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._disk_writes = 0
+        self.disk_evictions = 0
+        # key -> (expires_at, raw response body); least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            # Entries left by a previous run count towards the bounds too
+            self._sweep_disk()
+
+    @staticmethod
+    def is_cacheable(payload: ChatCompletionRequest) -> bool:
+        # Greedy sampling is the only mode where identical requests give identical answers
+        return not payload.stream and payload.temperature == 0
+
+    @staticmethod
+    def make_key(payload_dict: Dict[str, Any]) -> str:
+        # top_p has no effect under greedy sampling and stream does not change the result
+        normalized = {k: v for k, v in payload_dict.items() if k not in ("stream", "top_p")}
+        return hashlib.sha256(orjson.dumps(normalized, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[bytes]],
+        bypass: bool = False
+    ) -> Tuple[bytes, str]:
+        """Return (response, cache status); status is HIT, MISS, COALESCED or BYPASS"""
+        if bypass:
+            self.bypassed += 1
+            value = await fetch()
+            await self._put(key, value)
+            return value, "BYPASS"
+        
+        value = await self._get(key)
+        if value is not None:
+            return value, "HIT"
+        
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            status = "COALESCED"
+        else:
+            self.misses += 1
+            status = "MISS"
+            # A separate task keeps the fetch alive for waiters even if its first caller disconnects
+            task = asyncio.create_task(self._fetch_and_store(key, fetch))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._in_flight[key] = task
+        return await asyncio.shield(task), status
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        try:
+            value = await fetch()
+            await self._put(key, value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+        
+        if self.disk_dir:
+            entry = await asyncio.to_thread(self._read_disk, key, now)
+            if entry is not None:
+                self._store_memory(key, entry)
+                self.disk_hits += 1
+                return entry[1]
+        return None
+
+    async def _put(self, key: str, value: bytes):
+        entry = (time.time() + self.ttl, value)
+        self._store_memory(key, entry)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, entry)
+
+    def _store_memory(self, key: str, entry: Tuple[float, bytes]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, bytes]]:
+        # Bodies are stored verbatim; the file's mtime marks when the entry was written
+        path = self._disk_path(key)
+        try:
+            expires_at = os.path.getmtime(path) + self.ttl
+            if expires_at <= now:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return expires_at, f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, entry: Tuple[float, bytes]):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(entry[1])
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write response cache entry to disk: {str(e)}")
+        self._disk_writes += 1
+        if self._disk_writes % self.DISK_SWEEP_EVERY == 0:
+            self._sweep_disk()
+
+    def _sweep_disk(self):
+        """Delete expired files, then the oldest ones until the tier is within its entry and byte bounds"""
+        now = time.time()
+        files = []
+        try:
+            with os.scandir(self.disk_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue  # removed by a concurrent sweep or read
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"Failed to sweep response cache directory: {str(e)}")
+            return
+        files.sort()  # oldest first
+        count = len(files)
+        size = sum(entry[1] for entry in files)
+        for mtime, file_size, path in files:
+            if mtime + self.ttl > now and count <= self.disk_max_entries and size <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            count -= 1
+            size -= file_size
+            self.disk_evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": c.RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "disk_enabled": bool(self.disk_dir),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "disk_evictions": self.disk_evictions,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "in_flight": len(self._in_flight)
+        }
+
+response_cache = ResponseCache(
+    c.RESPONSE_CACHE_MAX_ENTRIES,
+    c.RESPONSE_CACHE_TTL,
+    c.RESPONSE_CACHE_DISK_DIR,
+    c.RESPONSE_CACHE_DISK_MAX_ENTRIES,
+    c.RESPONSE_CACHE_DISK_MAX_BYTES
+)
+
+# Background health prober for backends
+async def probe_backend(backend: Backend) -> bool:
     try:
-        async with httpx.AsyncClient(timeout=c.HEALTH_CHECK_TIMEOUT) as client:
-            response = await client.get(f"{c.LLM_BACKEND_URL}/v1/models")
-            backend_healthy = response.status_code == 200
-            last_health_check = current_time
-            logger.info(f"Backend health check: {'healthy' if backend_healthy else 'unhealthy'}")
-            return backend_healthy
+        response = await http_client.get(
+            f"{backend.url}/v1/models",
+            timeout=c.HEALTH_CHECK_TIMEOUT
+        )
+        healthy = response.status_code == 200
     except Exception as e:
-        logger.warning(f"Backend health check failed: {str(e)}")
-        backend_healthy = False
-        last_health_check = current_time
-        return False
+        logger.warning(f"Backend health check failed for {backend.url}: {str(e)}")
+        healthy = False
+    backend.record_probe(healthy)
+    # A recovered backend can take queued requests right away
+    admission_controller.dispatch()
+    logger.debug(f"Backend health check {backend.url}: {'healthy' if healthy else 'unhealthy'}")
+    return healthy
+
+def next_probe_delay(backend: Backend) -> float:
+    """Regular interval while healthy, exponential backoff while down, both jittered"""
+    if backend.probe_failures == 0:
+        delay = c.HEALTH_CHECK_INTERVAL
+    else:
+        delay = min(
+            c.HEALTH_CHECK_BACKOFF_MAX,
+            c.HEALTH_CHECK_BACKOFF_BASE * 2 ** (backend.probe_failures - 1)
+        )
+    return delay * random.uniform(1 - c.HEALTH_CHECK_JITTER, 1 + c.HEALTH_CHECK_JITTER)
+
+async def health_probe_loop(backend: Backend):
+    while True:
+        try:
+            await probe_backend(backend)
+        except Exception:
+            logger.exception(f"Health prober crashed for {backend.url}")
+        await asyncio.sleep(next_probe_delay(backend))
+
+def check_backend_health() -> bool:
+    """Cached backend health for request handlers; the prober does all I/O"""
+    return backend_pool.any_healthy()
+
+# SSE pass-through for streamed completions
+async def relay_backend_stream(
+    request: Request,
+    upstream: httpx.Response,
+    request_id: str,
+    backend: Backend,
+    tokens: int,
+    started: float
+):
+    """Forward backend SSE chunks as they arrive; closing upstream aborts the generation"""
+    chunk_count = 0
+    failed = False
+    try:
+        async for chunk in upstream.aiter_raw():
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected, cancelling upstream stream. Request ID: {request_id}")
+                break
+            if chunk_count == 0:
+                TIME_TO_FIRST_TOKEN.labels(backend.url).observe(time.perf_counter() - started)
+            chunk_count += 1
+            yield chunk
+        else:
+            logger.info(f"LLM backend stream finished ({chunk_count} chunks). Request ID: {request_id}")
+    except httpx.HTTPError as e:
+        logger.error(f"Stream error from llm_engine: {str(e)}. Request ID: {request_id}")
+        failed = True
+    finally:
+        # Also reached on cancellation when the client goes away mid-stream
+        await upstream.aclose()
+        elapsed = time.perf_counter() - started
+        admission_controller.release(backend, tokens, failed=failed, held=elapsed)
+        record_backend_time(backend.url, elapsed, "error" if failed else "ok")
+
+# Live controller state exported at scrape time
+class ControllerStateCollector:
+    """Reads pool, backend, cache and limiter state when Prometheus scrapes"""
+
+    def collect(self):
+        pool = get_pool_stats()
+        connections = GaugeMetricFamily(
+            "llm_controller_backend_connections", "Connections in the shared backend pool", labels=["state"]
+        )
+        connections.add_metric(["active"], pool["active_connections"])
+        connections.add_metric(["idle"], pool["idle_connections"])
+        yield connections
+        
+        backend_up = GaugeMetricFamily(
+            "llm_controller_backend_up", "1 unless the backend circuit breaker is open", labels=["backend"]
+        )
+        backend_in_flight = GaugeMetricFamily(
+            "llm_controller_backend_in_flight_requests", "Requests in flight per backend", labels=["backend"]
+        )
+        backend_failures = CounterMetricFamily(
+            "llm_controller_backend_failures", "Failed requests per backend", labels=["backend"]
+        )
+        for backend in backend_pool.backends:
+            backend_up.add_metric([backend.url], 1 if backend.healthy else 0)
+            backend_in_flight.add_metric([backend.url], backend.in_flight)
+            backend_failures.add_metric([backend.url], backend.total_failures)
+        yield backend_up
+        yield backend_in_flight
+        yield backend_failures
+        
+        cache_stats = response_cache.stats()
+        cache_lookups = CounterMetricFamily(
+            "llm_controller_response_cache_lookups", "Response cache lookups by result", labels=["result"]
+        )
+        for result in ("hits", "disk_hits", "misses", "coalesced", "bypassed"):
+            cache_lookups.add_metric([result], cache_stats[result])
+        yield cache_lookups
+        yield GaugeMetricFamily(
+            "llm_controller_response_cache_entries", "Entries in the in-memory response cache",
+            value=cache_stats["entries"]
+        )
+        
+        queue_depth = GaugeMetricFamily(
+            "llm_controller_admission_queue_depth", "Requests waiting for a backend slot", labels=["priority"]
+        )
+        for priority in PRIORITY_CLASSES:
+            queue_depth.add_metric([priority], admission_controller.queued(priority))
+        yield queue_depth
+        
+        active_keys = rate_limiter.active_keys()
+        if active_keys is not None:
+            yield GaugeMetricFamily(
+                "llm_controller_rate_limit_active_keys", "Clients tracked by the rate limiter", value=active_keys
+            )
+
+metrics_registry.register(ControllerStateCollector())
 
 # Lifespan manager for startup/shutdown
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global http_client
     logger.info(f"Starting {c.SERVICE_NAME} controller...")
-    # Startup: Check backend health
-    await check_backend_health()
+    # Startup: Create shared client, probe once, then keep probing in the background
+    http_client = create_http_client()
+    await asyncio.gather(*(probe_backend(backend) for backend in backend_pool.backends))
+    health_probe_tasks.extend(
+        asyncio.create_task(health_probe_loop(backend)) for backend in backend_pool.backends
+    )
     yield
     # Shutdown
     logger.info(f"Shutting down {c.SERVICE_NAME} controller...")
+    for task in health_probe_tasks:
+        task.cancel()
+    await asyncio.gather(*health_probe_tasks, return_exceptions=True)
+    health_probe_tasks.clear()
+    await http_client.aclose()
+    http_client = None
+    await rate_limiter.close()
 
 # FastAPI app with enhanced configuration
 app = FastAPI(
     title="LLM Controller API",
     description="Proxy controller for vLLM serving with enhanced features",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Request instrumentation for /metrics
+app.add_middleware(PrometheusMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -162,13 +1050,14 @@ app.add_middleware(
 # Enhanced error handler
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
             error=exc.detail,
             timestamp=datetime.now().isoformat(),
             request_id=request.headers.get("X-Request-ID")
-        ).dict()
+        ).dict(),
+        headers=getattr(exc, "headers", None)
     )
 
 @app.get("/", response_model=HealthResponse)
@@ -177,13 +1066,13 @@ async def root():
     return HealthResponse(
         status="✅ Controller is up and running!",
         timestamp=datetime.now().isoformat(),
-        backend_healthy=await check_backend_health(),
+        backend_healthy=check_backend_health(),
         version="1.0.0"
     )
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    is_healthy = await check_backend_health()
+    is_healthy = check_backend_health()
     return HealthResponse(
         status="healthy" if is_healthy else "degraded",
         timestamp=datetime.now().isoformat(),
@@ -195,23 +1084,153 @@ async def health_check():
 async def get_models(request: Request, _: None = Depends(rate_limit_check)):
     request_id = request.headers.get("X-Request-ID", "unknown")
     
+    backend = backend_pool.acquire()
+    if backend is None:
+        raise HTTPException(status_code=503, detail="Backend service unavailable")
+    
+    failed = False
     try:
-        async with httpx.AsyncClient(timeout=c.HEALTH_CHECK_TIMEOUT) as client:
-            response = await client.get(f"{c.LLM_BACKEND_URL}/v1/models")
-            response.raise_for_status()
-            
-            logger.info(f"Fetched model list from vLLM engine. Request ID: {request_id}")
-            return response.json()
-            
+        response = await http_client.get(
+            f"{backend.url}/v1/models",
+            timeout=c.HEALTH_CHECK_TIMEOUT
+        )
+        response.raise_for_status()
+        
+        logger.info(f"Fetched model list from vLLM engine. Request ID: {request_id}")
+        return response.json()
+        
     except httpx.TimeoutException:
+        failed = True
         logger.error(f"Timeout error from llm_engine on /v1/models. Request ID: {request_id}")
         raise HTTPException(status_code=504, detail="Backend timeout")
     except httpx.HTTPError as e:
+        failed = is_backend_failure(e)
         logger.error(f"HTTP error from llm_engine on /v1/models: {str(e)}. Request ID: {request_id}")
         raise HTTPException(status_code=502, detail="Failed to connect to backend")
     except Exception as e:
         logger.exception(f"Unexpected error in /v1/models. Request ID: {request_id}")
         raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        admission_controller.release(backend, failed=failed)
+
+async def send_chat_completion(
+    payload_dict: Dict[str, Any],
+    request_id: str,
+    max_tokens: int,
+    priority: str
+) -> bytes:
+    """Forward a non-streaming completion to a backend and return its body unparsed"""
+    # Cached health only: wait for a slot on a backend whose circuit lets the request through
+    backend = await admission_controller.acquire(priority, max_tokens, request_id)
+    
+    failed = False
+    started = time.perf_counter()
+    try:
+        response = await http_client.post(
+            f"{backend.url}/v1/chat/completions",
+            content=orjson.dumps(payload_dict),
+            headers={"X-Request-ID": request_id, "Content-Type": "application/json"},
+            timeout=c.BACKEND_TIMEOUT
+        )
+        response.raise_for_status()
+        backend_seconds = time.perf_counter() - started
+        
+        # Body is forwarded as-is; only the usage block is read for logging
+        body = response.content
+        usage = extract_usage(body)
+        record_usage(usage, backend_seconds)
+        logger.info(
+            f"LLM backend {backend.url} responded successfully. "
+            f"Tokens: {usage.get('total_tokens', 'N/A')}. "
+            f"Request ID: {request_id}"
+        )
+        
+        return body
+        
+    except httpx.TimeoutException:
+        failed = True
+        logger.error(f"Timeout error from llm_engine {backend.url}. Request ID: {request_id}")
+        raise HTTPException(status_code=504, detail="Backend timeout")
+    except httpx.HTTPError as e:
+        failed = is_backend_failure(e)
+        logger.error(f"HTTP error from llm_engine {backend.url}: {str(e)}. Request ID: {request_id}")
+        raise HTTPException(status_code=502, detail="Failed to connect to backend")
+    except Exception as e:
+        logger.exception(f"Unexpected error during request. Request ID: {request_id}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        elapsed = time.perf_counter() - started
+        admission_controller.release(backend, max_tokens, failed=failed, held=elapsed)
+        record_backend_time(backend.url, elapsed, "error" if failed else "ok")
+
+async def stream_chat_completion(
+    request: Request,
+    payload_dict: Dict[str, Any],
+    request_id: str,
+    max_tokens: int,
+    priority: str
+) -> StreamingResponse:
+    """Open a streaming completion on a backend and relay it as SSE"""
+    backend = await admission_controller.acquire(priority, max_tokens, request_id)
+    
+    streaming = False
+    failed = False
+    started = time.perf_counter()
+    try:
+        backend_request = http_client.build_request(
+            "POST",
+            f"{backend.url}/v1/chat/completions",
+            content=orjson.dumps(payload_dict),
+            headers={"X-Request-ID": request_id, "Content-Type": "application/json"},
+            timeout=c.BACKEND_TIMEOUT
+        )
+        upstream = await http_client.send(backend_request, stream=True)
+        if upstream.is_error:
+            await upstream.aread()
+            await upstream.aclose()
+            upstream.raise_for_status()
+        
+        logger.info(f"Streaming response from LLM backend {backend.url}. Request ID: {request_id}")
+        streaming = True
+        return StreamingResponse(
+            relay_backend_stream(request, upstream, request_id, backend, max_tokens, started),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Request-ID": request_id}
+        )
+        
+    except httpx.TimeoutException:
+        failed = True
+        logger.error(f"Timeout error from llm_engine {backend.url}. Request ID: {request_id}")
+        raise HTTPException(status_code=504, detail="Backend timeout")
+    except httpx.HTTPError as e:
+        failed = is_backend_failure(e)
+        logger.error(f"HTTP error from llm_engine {backend.url}: {str(e)}. Request ID: {request_id}")
+        raise HTTPException(status_code=502, detail="Failed to connect to backend")
+    except Exception as e:
+        logger.exception(f"Unexpected error during request. Request ID: {request_id}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        # Streaming responses release the backend when the relay finishes
+        if not streaming:
+            elapsed = time.perf_counter() - started
+            admission_controller.release(backend, max_tokens, failed=failed, held=elapsed)
+            record_backend_time(backend.url, elapsed, "error" if failed else "ok")
+
+async def complete_chat(
+    payload: ChatCompletionRequest,
+    request_id: str,
+    priority: str,
+    bypass_cache: bool = False
+) -> Tuple[bytes, Optional[str]]:
+    """Non-streaming completion, answered from the response cache when the request is deterministic"""
+    payload_dict = payload.dict()
+    if c.RESPONSE_CACHE_ENABLED and ResponseCache.is_cacheable(payload):
+        return await response_cache.get_or_fetch(
+            ResponseCache.make_key(payload_dict),
+            lambda: send_chat_completion(payload_dict, request_id, payload.max_tokens, priority),
+            bypass=bypass_cache
+        )
+    return await send_chat_completion(payload_dict, request_id, payload.max_tokens, priority), None
 
 @app.post("/v1/chat/completions")
 async def chat_completions(
@@ -220,53 +1239,146 @@ async def chat_completions(
     _: None = Depends(rate_limit_check)
 ):
     request_id = request.headers.get("X-Request-ID", f"req_{int(time.time())}")
+    priority = request_priority(request)
     payload_dict = payload.dict()
     
     logger.info(f"Received /v1/chat/completions request with {len(payload_dict['messages'])} messages. Request ID: {request_id}")
     
-    # Check backend health before processing
-    if not await check_backend_health():
-        logger.warning(f"Backend is unhealthy, rejecting request. Request ID: {request_id}")
-        raise HTTPException(status_code=503, detail="Backend service unavailable")
+    if payload.stream:
+        return await stream_chat_completion(request, payload_dict, request_id, payload.max_tokens, priority)
     
+    bypass = "no-cache" in request.headers.get("Cache-Control", "").lower()
+    body, cache_status = await complete_chat(payload, request_id, priority, bypass_cache=bypass)
+    if cache_status is None:
+        return Response(content=body, media_type="application/json")
+    logger.info(f"Response cache {cache_status}. Request ID: {request_id}")
+    return Response(content=body, media_type="application/json", headers={"X-Cache": cache_status})
+
+# Batch endpoint: many chat completions in one call, streamed back as NDJSON
+def parse_jsonl(raw: bytes) -> List[Any]:
+    items = []
+    for line_number, line in enumerate(raw.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            items.append(orjson.loads(line))
+        except orjson.JSONDecodeError as e:
+            # Keep the slot so indices still match input lines; the item reports the error
+            items.append(ValueError(f"Invalid JSON on line {line_number}: {str(e)}"))
+    return items
+
+async def read_batch_items(request: Request) -> List[Any]:
+    """Accept a JSON array, a {"requests": [...]} object, a JSONL body or a multipart JSONL upload"""
+    content_type = request.headers.get("Content-Type", "").lower()
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Multipart batch upload needs a 'file' field")
+        return parse_jsonl(await upload.read())
+    
+    raw = await request.body()
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return parse_jsonl(raw)
     try:
-        async with httpx.AsyncClient(timeout=c.BACKEND_TIMEOUT) as client:
-            response = await client.post(
-                f"{c.LLM_BACKEND_URL}/v1/chat/completions",
-                json=payload_dict,
-                headers={"X-Request-ID": request_id}
-            )
-            response.raise_for_status()
-            
-            json_response = response.json()
-            
-            # Log response summary
-            usage = json_response.get('usage', {})
-            logger.info(
-                f"LLM backend responded successfully. "
-                f"Tokens: {usage.get('total_tokens', 'N/A')}. "
-                f"Request ID: {request_id}"
-            )
-            
-            return JSONResponse(content=json_response)
-            
-    except httpx.TimeoutException:
-        logger.error(f"Timeout error from llm_engine. Request ID: {request_id}")
-        raise HTTPException(status_code=504, detail="Backend timeout")
-    except httpx.HTTPError as e:
-        logger.error(f"HTTP error from llm_engine: {str(e)}. Request ID: {request_id}")
-        raise HTTPException(status_code=502, detail="Failed to connect to backend")
-    except Exception as e:
-        logger.exception(f"Unexpected error during request. Request ID: {request_id}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+        body = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Batch body must be a JSON array or JSONL")
+    if isinstance(body, dict):
+        body = body.get("requests")
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Batch body must be a JSON array of chat requests")
+    return body
+
+async def run_batch(items: List[Any], request_id: str, priority: str, parallelism: int):
+    semaphore = asyncio.Semaphore(parallelism)
+    
+    def error_line(index: int, status_code: int, detail: Any) -> Tuple[bool, bytes]:
+        return False, orjson.dumps({"index": index, "error": {"status_code": status_code, "detail": detail}}) + b"\n"
+    
+    async def run_item(index: int, item: Any) -> Tuple[bool, bytes]:
+        try:
+            if isinstance(item, Exception):
+                raise item
+            payload = ChatCompletionRequest(**item)
+            # Batch results are returned whole, so items are never streamed
+            payload.stream = False
+        except (ValidationError, ValueError, TypeError) as e:
+            return error_line(index, 422, str(e))
+        
+        async with semaphore:
+            try:
+                body, _ = await complete_chat(payload, f"{request_id}-{index}", priority)
+            except HTTPException as e:
+                return error_line(index, e.status_code, e.detail)
+        # Splice the backend body in verbatim instead of re-encoding it
+        return True, b'{"index":%d,"response":%s}\n' % (index, body)
+    
+    tasks = [asyncio.create_task(run_item(index, item)) for index, item in enumerate(items)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            ok, line = await next_done
+            succeeded += ok
+            yield line
+        logger.info(f"Batch finished: {succeeded}/{len(items)} items succeeded. Request ID: {request_id}")
+    finally:
+        # Client went away: stop outstanding items
+        for task in tasks:
+            task.cancel()
+
+@app.post("/v1/batch")
+async def batch_completions(
+    request: Request,
+    parallelism: int = c.BATCH_MAX_PARALLELISM,
+    _: None = Depends(rate_limit_check)
+):
+    request_id = request.headers.get("X-Request-ID", f"batch_{int(time.time())}")
+    priority = request_priority(request, default="batch")
+    items = await read_batch_items(request)
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(items) > c.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {c.BATCH_MAX_ITEMS} items")
+    # Every item is a backend completion: the dependency charged the first, charge the rest
+    if len(items) > 1:
+        await charge_rate_limit(
+            request,
+            len(items) - 1,
+            detail=f"Batch of {len(items)} items exceeds the remaining rate limit budget"
+        )
+    parallelism = max(1, min(parallelism, c.BATCH_MAX_PARALLELISM))
+    
+    logger.info(
+        f"Received /v1/batch request with {len(items)} items, parallelism {parallelism}. Request ID: {request_id}"
+    )
+    return StreamingResponse(
+        run_batch(items, request_id, priority, parallelism),
+        media_type="application/x-ndjson",
+        headers={"X-Request-ID": request_id}
+    )
 
 @app.get("/metrics")
-async def metrics():
-    """Basic metrics endpoint for monitoring"""
+async def metrics(request: Request):
+    """Prometheus text exposition; send Accept: application/json for the JSON summary"""
+    if "application/json" not in request.headers.get("Accept", ""):
+        return Response(content=generate_latest(metrics_registry), media_type=CONTENT_TYPE_LATEST)
     return {
-        "backend_healthy": backend_healthy,
-        "last_health_check": last_health_check,
-        "active_rate_limits": len(rate_limit_store),
+        "backend_healthy": check_backend_health(),
+        "last_health_check": backend_pool.last_probe(),
+        "active_rate_limits": rate_limiter.active_keys(),
+        "connection_pool": get_pool_stats(),
+        "response_cache": response_cache.stats(),
+        "admission": {
+            "queued": {priority: admission_controller.queued(priority) for priority in PRIORITY_CLASSES},
+            "max_in_flight": admission_controller.max_in_flight,
+            "avg_service_time": admission_controller.avg_service_time
+        },
+        "load_balancer": {
+            "strategy": backend_pool.strategy,
+            "backends": [backend.to_dict() for backend in backend_pool.backends]
+        },
         "timestamp": datetime.now().isoformat()
     }
 
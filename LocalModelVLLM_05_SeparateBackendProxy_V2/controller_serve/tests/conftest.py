@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The controller modules are imported as top-level modules, as in the container
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main.py logs to logs/controller.log under the working directory; keep test runs out of it
+os.chdir(tempfile.mkdtemp(prefix="controller-tests-"))
@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+import orjson
+
+import main
+
+
+def completion(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, content=orjson.dumps({
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+    }))
+
+
+def test_batch_items_are_charged_to_the_rate_limit(monkeypatch):
+    items = lambda n: [{"messages": [{"role": "user", "content": f"q{i}"}]} for i in range(n)]
+
+    async def scenario():
+        monkeypatch.setattr(main, "rate_limiter", main.InMemoryRateLimitStore(
+            rate_per_minute=1, burst=5, idle_ttl=120, max_keys=100
+        ))
+        monkeypatch.setattr(main, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(completion)))
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://controller.test") as client:
+            too_big = await client.post("/v1/batch", json=items(10))
+            fits = await client.post("/v1/batch", json=items(3))
+            over_remaining = await client.post("/v1/batch", json=items(3))
+        return too_big, fits, over_remaining
+
+    too_big, fits, over_remaining = asyncio.run(scenario())
+    assert too_big.status_code == 429
+    assert "10 items" in too_big.json()["error"]
+    assert fits.status_code == 200
+    assert len(fits.text.splitlines()) == 3
+    # 5 tokens: the rejected batch spent its first, the accepted one 3, leaving 1
+    assert over_remaining.status_code == 429
@@ -0,0 +1,53 @@
+import asyncio
+import random
+import time
+
+from main import AdmissionController, BackendPool
+
+# Two fast replicas and one slow one (seconds per request)
+LATENCIES = {"http://fast-1": 0.01, "http://fast-2": 0.01, "http://slow": 0.1}
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_load(strategy: str, requests: int = 300, arrival_interval: float = 0.002):
+    """Send requests through admission control onto stub replicas; returns (latencies, requests per replica)"""
+    pool = BackendPool(list(LATENCIES), [], strategy)
+    admission = AdmissionController(pool, queue_size=requests)
+    rng = random.Random(0)
+
+    async def one(i: int) -> float:
+        started = time.perf_counter()
+        backend = await admission.acquire("interactive", 0, f"req-{i}")
+        held = time.perf_counter()
+        try:
+            await asyncio.sleep(LATENCIES[backend.url])
+        finally:
+            admission.release(backend, held=time.perf_counter() - held)
+        return time.perf_counter() - started
+
+    tasks = []
+    for i in range(requests):
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(rng.expovariate(1 / arrival_interval))
+    latencies = await asyncio.gather(*tasks)
+    return latencies, {backend.url: backend.total_requests for backend in pool.backends}
+
+
+def test_least_requests_avoids_the_slow_replica():
+    rr_latencies, rr_counts = asyncio.run(run_load("round_robin"))
+    lr_latencies, lr_counts = asyncio.run(run_load("least_requests"))
+    print(
+        f"round_robin    p50={percentile(rr_latencies, 0.5) * 1000:.1f}ms "
+        f"p99={percentile(rr_latencies, 0.99) * 1000:.1f}ms {rr_counts}\n"
+        f"least_requests p50={percentile(lr_latencies, 0.5) * 1000:.1f}ms "
+        f"p99={percentile(lr_latencies, 0.99) * 1000:.1f}ms {lr_counts}"
+    )
+    # Round robin sends the slow replica its full third of the traffic
+    assert rr_counts["http://slow"] >= 300 // 3 - 1
+    # Least outstanding requests routes around it as its requests pile up
+    assert lr_counts["http://slow"] < rr_counts["http://slow"] / 2
+    assert percentile(lr_latencies, 0.9) < percentile(rr_latencies, 0.9)
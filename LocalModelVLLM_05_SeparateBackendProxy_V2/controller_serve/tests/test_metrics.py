@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from main import PrometheusMiddleware, metrics_registry
+
+# Generous bound so the test is stable on slow CI machines; locally the overhead is a few microseconds
+MAX_OVERHEAD_MICROSECONDS = 100
+REQUESTS = 5000
+
+
+async def noop_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def time_requests(app) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/bench"}
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        await app(dict(scope), receive, send)
+    return time.perf_counter() - started
+
+
+def test_middleware_overhead_per_request():
+    async def scenario():
+        middleware = PrometheusMiddleware(noop_app)
+        await time_requests(middleware)  # warm up label children
+        # Best of a few rounds to filter out scheduler noise
+        bare = min([await time_requests(noop_app) for _ in range(3)])
+        instrumented = min([await time_requests(middleware) for _ in range(3)])
+        return (instrumented - bare) / REQUESTS * 1e6
+
+    overhead = asyncio.run(scenario())
+    print(f"PrometheusMiddleware overhead: {overhead:.2f} us/request")
+    assert overhead < MAX_OVERHEAD_MICROSECONDS
+
+
+def test_middleware_records_route_latency():
+    def count():
+        labels = {"route": "unmatched", "method": "GET", "status": "200"}
+        return metrics_registry.get_sample_value("llm_controller_request_duration_seconds_count", labels) or 0
+
+    before = count()
+    asyncio.run(time_requests(PrometheusMiddleware(noop_app)))
+    assert count() == before + REQUESTS
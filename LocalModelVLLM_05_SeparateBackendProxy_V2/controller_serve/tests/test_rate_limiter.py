@@ -0,0 +1,169 @@
+import asyncio
+import time
+import tracemalloc
+
+import main
+from main import InMemoryRateLimitStore, RedisRateLimitStore
+
+CLIENTS = 10_000
+ROUNDS = 5
+# Loose bounds so the test is stable on slow CI machines; run with -s to see the measured values
+MAX_CHECK_MICROSECONDS = 50
+MAX_BYTES_PER_CLIENT = 1024
+
+
+class FakeRedis:
+    """The subset of redis.asyncio the sliding-window store uses, kept in a dict"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+    async def decr(self, key: str, amount: int = 1):
+        self.data[key] = self.data.get(key, 0) - amount
+        return self.data[key]
+
+    async def aclose(self):
+        self.data.clear()
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis):
+        self.client = client
+        self.commands = []
+
+    def incr(self, key: str, amount: int = 1):
+        self.commands.append(("incr", key, amount))
+
+    def expire(self, key: str, seconds: int):
+        self.commands.append(("expire", key, seconds))
+
+    def get(self, key: str):
+        self.commands.append(("get", key))
+
+    async def execute(self):
+        results = []
+        for name, key, *args in self.commands:
+            if name == "incr":
+                self.client.data[key] = self.client.data.get(key, 0) + args[0]
+                results.append(self.client.data[key])
+            elif name == "expire":
+                self.client.expiry[key] = args[0]
+                results.append(True)
+            else:
+                value = self.client.data.get(key)
+                results.append(None if value is None else str(value).encode())
+        return results
+
+
+async def time_checks(store) -> float:
+    """Microseconds per hit over ROUNDS passes of CLIENTS distinct keys"""
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for i in range(CLIENTS):
+            await store.hit(f"ip:10.0.{i // 256}.{i % 256}")
+    return (time.perf_counter() - started) / (ROUNDS * CLIENTS) * 1e6
+
+
+def test_in_memory_store_cost_and_memory():
+    def new_store():
+        return InMemoryRateLimitStore(rate_per_minute=100, burst=100, idle_ttl=120, max_keys=100_000)
+
+    async def scenario():
+        store = new_store()
+        per_check = await time_checks(store)
+        # Memory is measured on a second store, since tracing allocations slows down the timing
+        tracemalloc.start()
+        traced = new_store()
+        await time_checks(traced)
+        resident, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return store, per_check, resident
+
+    store, per_check, resident = asyncio.run(scenario())
+    per_client = resident / CLIENTS
+    print(f"in-memory: {per_check:.2f} us/check, {per_client:.0f} bytes/client")
+    assert store.active_keys() == CLIENTS
+    assert per_check < MAX_CHECK_MICROSECONDS
+    assert per_client < MAX_BYTES_PER_CLIENT
+
+
+def test_in_memory_store_evicts_past_max_keys():
+    async def scenario():
+        store = InMemoryRateLimitStore(rate_per_minute=100, burst=100, idle_ttl=120, max_keys=1000)
+        await time_checks(store)
+        return store
+
+    assert asyncio.run(scenario()).active_keys() == 1000
+
+
+def test_redis_store_cost_with_fake_client():
+    async def scenario():
+        client = FakeRedis()
+        store = RedisRateLimitStore(client, rate_per_minute=100)
+        per_check = await time_checks(store)
+        return client, per_check
+
+    client, per_check = asyncio.run(scenario())
+    print(f"redis (fake client): {per_check:.2f} us/check, {len(client.data)} keys")
+    # One counter per client per window, each with an expiry
+    assert len(client.data) >= CLIENTS
+    assert set(client.expiry.values()) == {120}
+    assert per_check < MAX_CHECK_MICROSECONDS
+
+
+def test_redis_store_rejects_past_the_limit():
+    async def scenario():
+        store = RedisRateLimitStore(FakeRedis(), rate_per_minute=3)
+        return [await store.hit("ip:1.2.3.4") for _ in range(5)]
+
+    results = asyncio.run(scenario())
+    assert results[:3] == [0.0, 0.0, 0.0]
+    assert all(retry_after > 0 for retry_after in results[3:])
+
+
+def make_request(headers: dict, host: str = "10.0.0.1"):
+    from starlette.requests import Request
+
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": (host, 1234)
+    })
+
+
+def test_only_configured_api_keys_get_their_own_bucket(monkeypatch):
+    monkeypatch.setattr(main.c, "RATE_LIMIT_KEY_BY", "api_key")
+    monkeypatch.setattr(main, "rate_limit_api_keys", {main.hash_api_key("team-a-key")})
+
+    known = main.rate_limit_key(make_request({"X-API-Key": "team-a-key"}))
+    assert known == "key:" + main.hash_api_key("team-a-key")
+    assert main.rate_limit_key(make_request({"Authorization": "Bearer team-a-key"}, host="10.0.0.2")) == known
+    # Made-up keys all share the caller's IP bucket
+    assert {
+        main.rate_limit_key(make_request({"X-API-Key": f"random-{i}"})) for i in range(100)
+    } == {"ip:10.0.0.1"}
+
+
+def test_stores_charge_a_cost_per_hit():
+    async def scenario():
+        memory = InMemoryRateLimitStore(rate_per_minute=60, burst=10, idle_ttl=120, max_keys=100)
+        redis_store = RedisRateLimitStore(FakeRedis(), rate_per_minute=10)
+        results = []
+        for store in (memory, redis_store):
+            results.append([
+                await store.hit("ip:1.2.3.4", 8),   # fits
+                await store.hit("ip:1.2.3.4", 5),   # only 2 left: rejected, nothing taken
+                await store.hit("ip:1.2.3.4", 2),   # the remaining budget
+            ])
+        return results
+
+    for first, over, rest in asyncio.run(scenario()):
+        assert first == 0.0
+        assert over > 0
+        assert rest == 0.0
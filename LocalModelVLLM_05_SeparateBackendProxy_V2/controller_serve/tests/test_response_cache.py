@@ -0,0 +1,31 @@
+import os
+import time
+
+from main import ResponseCache
+
+
+def test_disk_tier_is_bounded_by_entries_and_bytes(tmp_path):
+    cache = ResponseCache(max_entries=4, ttl=300, disk_dir=str(tmp_path), disk_max_entries=10, disk_max_bytes=10 ** 6)
+    cache.DISK_SWEEP_EVERY = 1
+    for i in range(25):
+        cache._write_disk(f"key{i:02d}", (0.0, b"x" * 100))
+    names = sorted(os.listdir(tmp_path))
+    assert len(names) == 10
+    # The newest entries are the ones kept
+    assert names[-1] == "key24.json"
+
+    cache.disk_max_bytes = 500
+    cache._sweep_disk()
+    assert len(os.listdir(tmp_path)) == 5
+
+
+def test_expired_disk_entries_are_swept(tmp_path):
+    stale = tmp_path / "stale.json"
+    stale.write_bytes(b"{}")
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    (tmp_path / "fresh.json").write_bytes(b"{}")
+
+    cache = ResponseCache(max_entries=4, ttl=300, disk_dir=str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["fresh.json"]
+    assert cache.stats()["disk_evictions"] == 1